@@ -1,11 +1,43 @@
 import os
+import re
+import json
+import logging
 import shutil
+import socket
 import subprocess
+import time
+import urllib.error
+import urllib.request
 import mimetypes
 import pandas as pd
 from pathlib import Path
 from tqdm import tqdm
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Текстовые форматы, которые конвертируются через долгоживущий `pandoc server`.
+# Остальным форматам нужен --extract-media и чтение с диска, поэтому для них
+# по-прежнему запускается отдельный процесс pandoc.
+PANDOC_SERVER_FORMATS = {'markdown', 'rst', 'org', 'latex'}
+PANDOC_SERVER_STARTUP_TIMEOUT = 5.0
+PANDOC_SERVER_REQUEST_TIMEOUT = 60.0
+
+# Ссылки на локальные изображения в текстовых форматах (markdown/html, rst, latex, org).
+# pandoc server работает в песочнице и не читает файлы с диска, поэтому --extract-media
+# для таких документов выполняется только через отдельный процесс pandoc
+_RE_MEDIA_REF = re.compile(
+    r'!\[|<img\b|\.\. +(?:image|figure)::|\\includegraphics|\[\[(?:file:|\./)',
+    re.IGNORECASE
+)
+
+# HTML-теги img и markdown-ссылки на изображения (с учетом стилей) за один проход
+_RE_ANY_IMG = re.compile(
+    r'(?P<html><img[^>]+>)'
+    r'|!\[(?P<alt>.*?)\](?:\((?P<path>[^)]+)\))(?:\{(?P<style>[^}]*)\})?'
+)
+# Размеры изображения в дюймах: width=6.46in, height="2in" и т.п.
+_RE_DIM = re.compile(r'(width|height)=["\']?([0-9.]+)in["\']?')
 
 class MDConverter:
     def __init__(self, base_prefix: str = None):
@@ -18,6 +50,8 @@ class MDConverter:
         """
         self.base_prefix = base_prefix
         self.image_counter = 1  # Глобальный счетчик для всех изображений
+        # Кэш уже созданных папок вложений: (директория, имя файла) -> путь
+        self._folder_cache: Dict[Tuple[Path, str], Path] = {}
         self.supported_extensions = {
             'document': [
                 # Microsoft Office
@@ -54,6 +88,133 @@ class MDConverter:
             'failed_conversions': 0,
             'errors': []
         }
+        # Процесс `pandoc server` запускается при первом текстовом файле
+        self._server_proc: Optional[subprocess.Popen] = None
+        self._server_url: Optional[str] = None
+        self._server_unavailable = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Останавливает процесс pandoc server, если он был запущен."""
+        proc = getattr(self, '_server_proc', None)
+        if proc is None:
+            return
+        self._server_proc = None
+        self._server_url = None
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def ensure_pandoc_server(self) -> Optional[str]:
+        """
+        Запускает `pandoc server` при первом обращении и возвращает его адрес.
+        Возвращает None, если сервер недоступен (старая версия pandoc и т.п.).
+        """
+        if self._server_url or self._server_unavailable:
+            return self._server_url
+
+        # Выбираем свободный порт: pandoc server не умеет слушать порт 0
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+
+        try:
+            proc = subprocess.Popen(
+                ['pandoc', 'server', '--port', str(port)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except OSError as e:
+            logger.warning("Не удалось запустить pandoc server: %s", e)
+            self._server_unavailable = True
+            return None
+
+        url = f"http://127.0.0.1:{port}/"
+        deadline = time.monotonic() + PANDOC_SERVER_STARTUP_TIMEOUT
+        while time.monotonic() < deadline and proc.poll() is None:
+            try:
+                with urllib.request.urlopen(url + 'version', timeout=1):
+                    pass
+                self._server_proc = proc
+                self._server_url = url
+                logger.debug("pandoc server запущен: %s", url)
+                return url
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.1)
+
+        logger.warning("pandoc server недоступен, используется запуск pandoc для каждого файла")
+        if proc.poll() is None:
+            proc.kill()
+        self._server_unavailable = True
+        return None
+
+    @staticmethod
+    def get_server_options(pandoc_params: list) -> dict:
+        """
+        Переводит параметры командной строки pandoc в поля JSON-запроса pandoc server:
+        --opt=value -> {"opt": value}, --flag -> {"flag": true}.
+        """
+        options = {}
+        for param in pandoc_params:
+            name, sep, value = param.lstrip('-').partition('=')
+            if not sep:
+                options[name] = True
+            else:
+                options[name] = int(value) if value.isdigit() else value
+        # Медиа извлекаются только у документов без ссылок на изображения, т.е. это no-op,
+        # а песочница сервера не пишет на диск
+        options.pop('extract-media', None)
+        return options
+
+    def convert_via_server(self, url: str, text: str, input_format: str, output_file: Path,
+                           pandoc_params: list):
+        """
+        Конвертирует текстовый файл через pandoc server с теми же параметрами, что и CLI.
+        
+        Returns:
+            Optional[str]: Текст ошибки или None при успехе
+        
+        Raises:
+            ConnectionError: Сервер не ответил; он останавливается, дальше используется CLI
+        """
+        payload = {
+            'text': text,
+            'from': input_format,
+            'to': 'markdown',
+            **self.get_server_options(pandoc_params)
+        }
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode('utf-8'),
+            headers={'Content-Type': 'application/json', 'Accept': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=PANDOC_SERVER_REQUEST_TIMEOUT) as response:
+                result = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            return e.read().decode('utf-8', errors='replace').strip()
+        except (urllib.error.URLError, OSError) as e:
+            # Сервер упал или завис (в т.ч. таймаут): больше к нему не обращаемся
+            logger.warning("pandoc server не отвечает (%s), используется запуск pandoc для каждого файла", e)
+            self.close()
+            self._server_unavailable = True
+            raise ConnectionError(str(e)) from e
+
+        if 'error' in result:
+            return result['error']
+        output_file.write_text(result['output'], encoding='utf-8')
+        return None
 
     def is_supported_file(self, file_path: Path) -> bool:
         """Проверяет, поддерживается ли формат файла."""
@@ -80,7 +241,6 @@ class MDConverter:
         """Создает подпапку для файла в папке Attachments если она не существует."""
         file_attachments = attachments / original_file.stem
         file_attachments.mkdir(parents=True, exist_ok=True)
-        print(f"Создана папка для вложений: {file_attachments}")  # Отладочный вывод
         return file_attachments
 
     def get_pandoc_format(self, file_path: Path) -> str:
@@ -192,23 +352,25 @@ class MDConverter:
 
     def process_markdown_content(self, content: str, current_dir: Path, base_dir: Path, original_file: Path) -> str:
         """Обрабатывает содержимое markdown файла для корректировки путей к изображениям."""
-        import re
-        
-        # Создаем папки для файлов только если есть изображения
-        source_docs = None
-        attachments = None
-        file_attachments = None
-        
+        # Папки для файлов создаются только если есть изображения
         def ensure_folders():
             """Создает необходимые папки при первом обращении к ним."""
-            nonlocal source_docs, attachments, file_attachments
-            if source_docs is None:
-                source_docs = self.create_source_docs_folder(current_dir)
-                attachments = self.create_attachments_folder(source_docs)
-                file_attachments = self.create_file_attachments_folder(attachments, original_file)
+            key = (current_dir, original_file.stem)
+            if key in self._folder_cache:
+                return self._folder_cache[key]
+            source_docs = self.create_source_docs_folder(current_dir)
+            attachments = self.create_attachments_folder(source_docs)
+            file_attachments = self.create_file_attachments_folder(attachments, original_file)
+            self._folder_cache[key] = file_attachments
             return file_attachments
 
-        def process_image(img_path: str, style: str = None) -> str:
+        def parse_dims(style: Optional[str]) -> Dict[str, int]:
+            """Извлекает размеры из стиля и переводит дюймы в пиксели (приблизительно 96 DPI)."""
+            if not style:
+                return {}
+            return {m.group(1): int(float(m.group(2)) * 96) for m in _RE_DIM.finditer(style)}
+
+        def process_image(img_path: str, dims: Optional[Dict[str, int]] = None) -> str:
             """Обрабатывает путь к изображению и возвращает markdown-ссылку."""
             try:
                 # Убираем экранирование и начальные ./
@@ -253,21 +415,15 @@ class MDConverter:
                     attachment_path = attachment_path.strip('/')  # Убираем начальные и конечные слеши
                     
                     # Добавляем размеры изображения, если они были
-                    if style:
-                        width_match = re.search(r'width=([0-9.]+in)', style)
-                        height_match = re.search(r'height=([0-9.]+in)', style)
-                        if width_match or height_match:
-                            # Конвертируем дюймы в пиксели (приблизительно 96 DPI)
-                            width = int(float(width_match.group(1)) * 96) if width_match else None
-                            height = int(float(height_match.group(1)) * 96) if height_match else None
-                            
-                            # Формируем HTML-тег изображения
-                            img_attributes = []
-                            if width:
-                                img_attributes.append(f'width="{width}"')
-                            if height:
-                                img_attributes.append(f'height="{height}"')
-                            
+                    if dims:
+                        # Формируем HTML-тег изображения
+                        img_attributes = []
+                        if dims.get('width'):
+                            img_attributes.append(f'width="{dims["width"]}"')
+                        if dims.get('height'):
+                            img_attributes.append(f'height="{dims["height"]}"')
+                        
+                        if img_attributes:
                             return f'<img src="{attachment_path}" {" ".join(img_attributes)} />'
                     
                     return f"![](<{attachment_path}>)"
@@ -277,11 +433,11 @@ class MDConverter:
                     return f"![](<{img_path}>)"
                 
                 # Логируем, что изображение не найдено
-                print(f"Изображение не найдено: {img_path} в {current_dir}")
+                logger.warning("Изображение не найдено: %s в %s", img_path, current_dir)
                 return f"![Изображение не найдено: {img_path}]()"
                 
             except Exception as e:
-                print(f"Ошибка при обработке изображения {img_path}: {str(e)}")
+                logger.error("Ошибка при обработке изображения %s: %s", img_path, e)
                 return f"![Ошибка обработки изображения: {img_path}]()"
 
         def replace_html_img(match):
@@ -290,39 +446,31 @@ class MDConverter:
             style = re.search(r'style="([^"]+)"', match.group(0))
             
             if src:
-                return process_image(src.group(1), style.group(1) if style else None)
+                return process_image(src.group(1), parse_dims(style.group(1) if style else None))
             return match.group(0)
 
         def replace_markdown_img(match):
             """Заменяет markdown-ссылки на изображения."""
-            alt_text = match.group(1) or ""
-            img_path = match.group(2)
-            style = None
-            
-            # Извлекаем стиль, если он есть (поддержка обоих форматов)
-            style_match = re.search(r'{([^}]+)}', match.group(0))
-            if style_match:
-                style = style_match.group(1)
-                # Преобразуем формат width=6.46in в width="6.46in"
-                style = re.sub(r'width=([0-9.]+in)', r'width="\1"', style)
-                style = re.sub(r'height=([0-9.]+in)', r'height="\1"', style)
-            
-            return process_image(img_path, style)
+            return process_image(match.group('path'), parse_dims(match.group('style')))
 
-        # Заменяем HTML-теги img
-        content = re.sub(r'<img[^>]+>', replace_html_img, content)
-        
-        # Заменяем markdown-ссылки на изображения (с учетом стилей)
-        content = re.sub(r'!\[(.*?)\](?:\(([^)]+)\))(?:{[^}]*})?', replace_markdown_img, content)
+        # Собираем результат по частям за один проход вместо повторных re.sub
+        out = []
+        last = 0
+        for match in _RE_ANY_IMG.finditer(content):
+            out.append(content[last:match.start()])
+            if match.group('html'):
+                out.append(replace_html_img(match))
+            else:
+                out.append(replace_markdown_img(match))
+            last = match.end()
+        out.append(content[last:])
         
-        return content
+        return ''.join(out)
 
     def convert_file(self, file_path: Path, base_dir: Path) -> bool:
         """Конвертирует файл в markdown."""
         try:
-            print(f"\nПроверка файла: {file_path}")
-            print(f"Существует: {file_path.exists()}")
-            print(f"Абсолютный путь: {file_path.absolute()}")
+            logger.debug("Проверка файла: %s", file_path)
             
             if not file_path.exists():
                 self.stats['failed_conversions'] += 1
@@ -341,6 +489,23 @@ class MDConverter:
             # Получаем параметры для pandoc
             pandoc_params = self.get_pandoc_params(file_path)
             
+            # Текстовые форматы без ссылок на изображения отправляем в уже запущенный pandoc server
+            if input_format in PANDOC_SERVER_FORMATS:
+                text = file_path.read_text(encoding='utf-8')
+                server_url = None if _RE_MEDIA_REF.search(text) else self.ensure_pandoc_server()
+                if server_url:
+                    try:
+                        error = self.convert_via_server(server_url, text, input_format, output_file, pandoc_params)
+                    except ConnectionError:
+                        pass  # Сервер недоступен: конвертируем через CLI ниже
+                    else:
+                        if error is None:
+                            self.stats['successful_conversions'] += 1
+                            return True
+                        self.stats['failed_conversions'] += 1
+                        self.stats['errors'].append((str(file_path), f"Pandoc error: {error}"))
+                        return False
+            
             # Формируем команду для pandoc
             command = [
                 'pandoc',
@@ -350,7 +515,8 @@ class MDConverter:
                 '-o', str(output_file)
             ] + pandoc_params
             
-            print(f"Выполняется команда: {' '.join(command)}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Выполняется команда: %s", ' '.join(command))
             
             # Выполняем конвертацию
             result = subprocess.run(command, capture_output=True, text=True)
@@ -373,15 +539,14 @@ class MDConverter:
     def process_directory(self, directory: Path):
         """Обрабатывает все файлы в директории."""
         try:
-            print(f"\nОбработка директории: {directory}")
-            print(f"Существует: {directory.exists()}")
-            print(f"Абсолютный путь: {directory.absolute()}")
+            logger.debug("Обработка директории: %s", directory.absolute())
             
             # Получаем список всех файлов в директории
             files = [f for f in directory.rglob('*') if f.is_file() and self.is_supported_file(f)]
-            print(f"\nНайдено файлов для конвертации: {len(files)}")
-            for f in files:
-                print(f"- {f}")
+            logger.info("Найдено файлов для конвертации: %d", len(files))
+            if logger.isEnabledFor(logging.DEBUG):
+                for f in files:
+                    logger.debug("- %s", f)
                 
             self.stats['total_files'] = len(files)
             
@@ -390,7 +555,7 @@ class MDConverter:
                 self.convert_file(file_path, directory)
                 
         except Exception as e:
-            print(f"Ошибка при обработке директории: {e}")
+            logger.error("Ошибка при обработке директории: %s", e)
 
     def print_statistics(self):
         """Выводит статистику конвертации."""
@@ -407,6 +572,11 @@ class MDConverter:
 
 def main():
     import sys
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.WARNING
+    )
+
     if len(sys.argv) != 2 and len(sys.argv) != 3:
         print("Использование: python md_converter.py <путь_к_директории> [базовый_префикс]")
         sys.exit(1)
@@ -430,9 +600,9 @@ def main():
             if 'Paths' in config and 'base_prefix' in config['Paths']:
                 base_prefix = config['Paths']['base_prefix']
 
-    converter = MDConverter(base_prefix)
-    converter.process_directory(directory)
-    converter.print_statistics()
+    with MDConverter(base_prefix) as converter:
+        converter.process_directory(directory)
+        converter.print_statistics()
 
 if __name__ == "__main__":
     main()
@@ -2,7 +2,6 @@ from telegram.ext import Updater, MessageHandler, Filters, CallbackContext
 from telegram import Update
 import logging
 from typing import List, Dict
-import pandas as pd
 import sys
 
 from config import TELEGRAM_BOT_TOKEN, OPENAI_API_KEY, PICKLE_FILE_PATH
@@ -77,9 +76,7 @@ def main():
         
         # Загрузка существующих данных, если есть
         global news_data
-        existing_data = load_from_pickle(PICKLE_FILE_PATH)
-        if not existing_data.empty:
-            news_data = existing_data.to_dict('records')
+        news_data = load_from_pickle(PICKLE_FILE_PATH) or []
         
         # Инициализация бота
         updater = Updater(TELEGRAM_BOT_TOKEN)
@@ -1,5 +1,4 @@
 import openai
-import pandas as pd
 from datetime import datetime
 import pickle
 from typing import Dict, List, Union
@@ -91,14 +90,13 @@ def save_to_pickle(data: List[Dict], filepath: str):
         filepath (str): Путь к файлу для сохранения
     """
     try:
-        df = pd.DataFrame(data)
         with open(filepath, 'wb') as f:
-            pickle.dump(df, f)
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
         logger.info(f"Данные успешно сохранены в {filepath}")
     except Exception as e:
         logger.error(f"Ошибка при сохранении данных: {str(e)}")
 
-def load_from_pickle(filepath: str) -> pd.DataFrame:
+def load_from_pickle(filepath: str) -> List[Dict]:
     """
     Загрузка данных из pickle файла
     
@@ -106,14 +104,18 @@ def load_from_pickle(filepath: str) -> pd.DataFrame:
         filepath (str): Путь к файлу для загрузки
         
     Returns:
-        pd.DataFrame: Загруженные данные
+        List[Dict]: Загруженные записи
     """
     try:
         with open(filepath, 'rb') as f:
-            return pickle.load(f)
+            data = pickle.load(f)
+        # Файлы старого формата содержат DataFrame
+        if hasattr(data, 'to_dict'):
+            data = data.to_dict('records')
+        return data
     except Exception as e:
         logger.error(f"Ошибка при загрузке данных: {str(e)}")
-        return pd.DataFrame()
+        return []
 
 def verify_telegram_token(token: str) -> bool:
     """
@@ -1,40 +1,64 @@
 import os
 import logging
+import logging.handlers
+import queue
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ContextTypes, JobQueue
-from utils.audio_processor import AudioProcessor
+from aiolimiter import AsyncLimiter
+from utils.audio_processor import AudioProcessor, decode_to_array, temp_name
 from utils.transcriber import Transcriber
-from utils.telegram_sender import TelegramSender
+from utils.telegram_sender import TelegramSender, make_rate_limiter
 from utils.youtube_info import YouTubeInfo
+from utils.ttl_cache import TTLCache
 import config
 import aiohttp
 import time
 from typing import Optional, Dict, Any
 import aiofiles
+import aiofiles.os
 from telegram.constants import ChatAction
 from utils.pdf_converter import generate_pdf
+from utils.gpu_info import enumerate_dxgi_gpus, gpu_snapshot
 import signal
 import asyncio
 import sys
 import re
 import yt_dlp
+import functools
+import json
+import sysconfig
+import hashlib
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from datetime import datetime, timedelta
 
-# Setup logging
+# Setup logging: обработчики пишут в файл и консоль в отдельном потоке
+# QueueListener, основной поток (и event loop) только кладёт записи в очередь
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_file_handler = logging.FileHandler('bot.log', encoding='utf-8', delay=True)
+_log_stream_handler = logging.StreamHandler()
+for _handler in (_log_file_handler, _log_stream_handler):
+    _handler.setFormatter(_log_formatter)
+_log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    _log_queue, _log_file_handler, _log_stream_handler, respect_handler_level=True
+)
+# Подробный лог включается переменной DEBUG (например, DEBUG=1) в окружении или .env
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
+    level=logging.DEBUG if config.DEBUG_LOGGING else logging.INFO,
+    handlers=[logging.handlers.QueueHandler(_log_queue)]
 )
+# httpx и telegram пишут запись на каждый запрос к API, оставляем только предупреждения
+logging.getLogger('httpx').setLevel(logging.WARNING)
+logging.getLogger('telegram').setLevel(logging.WARNING)
+log_listener.start()
 logger = logging.getLogger(__name__)
 
 # Initialize processors
-audio_processor = AudioProcessor(temp_dir=config.TEMP_DIRECTORY)
+# AudioProcessor и Transcriber (с весами локальной модели) создаются один раз в main()
+# и хранятся в application.bot_data["media"] / ["tx"]
 youtube_info = YouTubeInfo()
-transcriber = Transcriber()
 telegram_sender = TelegramSender(
     transcript_bot_token=config.TRANSCRIPT_BOT_TOKEN,
     obsimatic_bot_token=config.OBSIMATIC_BOT_TOKEN,
@@ -44,59 +68,143 @@ telegram_sender = TelegramSender(
 MAX_VIDEO_SIZE_MB = config.REGULAR_SIZE_LIMIT_MB
 MAX_AUDIO_SIZE_MB = config.REGULAR_SIZE_LIMIT_MB
 
-# Global variable to track shutdown state
-is_shutting_down = False
+# Размер блока при загрузке файлов и частота логирования прогресса (в блоках)
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+DOWNLOAD_PROGRESS_EVERY = 16
 
-async def shutdown(signal_type, loop, application):
-    """Cleanup and shutdown the bot gracefully"""
-    global is_shutting_down
-    
-    if is_shutting_down:
-        return
-        
-    is_shutting_down = True
-    
-    logger.info(f"\nReceived signal {signal_type.name}...")
-    logger.info("Cleaning up resources...")
+# Общая HTTP-сессия для загрузки файлов (переиспользует соединения с api.telegram.org)
+_http_session: Optional[aiohttp.ClientSession] = None
+
+# Ограничение частоты запросов get_file к Telegram при загрузке больших файлов
+_file_fetch_limiter = AsyncLimiter(10, 1)
+
+# Ограничение числа одновременно обрабатываемых видео/аудио заданий
+MAX_PARALLEL_JOBS = max(1, (os.cpu_count() or 2) // 2)
+JOB_GATE = asyncio.Semaphore(MAX_PARALLEL_JOBS)
+_queued_jobs = 0
+
+# Кэш результата get_me: (время получения, объект User)
+_bot_me_cache: Optional[tuple] = None
+
+# Кэш метаданных YouTube: video_id -> информация о видео (ограничен по размеру и времени жизни)
+_video_info_cache = TTLCache(config.YOUTUBE_INFO_CACHE_SIZE, config.YOUTUBE_INFO_CACHE_TTL)
+
+# Пул потоков для блокирующих вызовов yt_dlp (ограничивает число параллельных загрузок)
+_ytdlp_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='yt_dlp')
+
+def _whisper_workers() -> int:
+    """
+    Число потоков для Whisper: не меньше числа воркеров локальной модели и числа GPU.
     
-    # Clean up temp directories
+    Инференс CTranslate2 идет в C++ без GIL, поэтому потоки дают настоящий параллелизм
+    и, в отличие от пула процессов, используют одну загруженную в память модель.
+    """
+    if not config.USE_LOCAL_WHISPER:
+        # Облачный API ограничен сетью, а не CPU: запросы всех одновременных заданий
+        # выполняются параллельно, а не в очереди из одного потока
+        return MAX_PARALLEL_JOBS
     try:
-        if os.path.exists(config.TEMP_DIRECTORY):
-            for file in os.listdir(config.TEMP_DIRECTORY):
-                file_path = os.path.join(config.TEMP_DIRECTORY, file)
-                try:
-                    if os.path.isfile(file_path):
-                        os.unlink(file_path)
-                except Exception as e:
-                    logger.error(f"Error deleting {file_path}: {e}")
-    except Exception as e:
-        logger.error(f"Error cleaning temp directory: {e}")
+        import ctranslate2
+        return max(1, config.WHISPER_NUM_WORKERS, ctranslate2.get_cuda_device_count())
+    except Exception:
+        return max(1, config.WHISPER_NUM_WORKERS)
+
+# Отдельный пул для транскрибации, чтобы она не блокировала цикл событий
+_whisper_pool = ThreadPoolExecutor(max_workers=_whisper_workers(), thread_name_prefix='whisper')
 
-    # Stop the application
+# Пул для генерации PDF: сама конвертация идет в дочерних процессах pandoc/wkhtmltopdf,
+# поэтому потокам не мешает GIL, а число одновременно запущенных конвертеров ограничено
+_pdf_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='pdf')
+
+# Очередь заданий на PDF и задача, которая разбирает ее пачками
+_pdf_queue: Optional[asyncio.Queue] = None
+_pdf_dispatcher_task: Optional[asyncio.Task] = None
+
+# Единый паттерн для всех форматов YouTube URL (watch, shorts, embed, v, youtu.be, nocookie);
+# группа id - 11-символьный идентификатор видео
+_YOUTUBE_URL_RE = re.compile(
+    r'(?:https?://)?(?:www\.|m\.)?'
+    r'(?:youtube(?:-nocookie)?\.com/(?:watch\?v=|embed/|v/|shorts/)|youtu\.be/)'
+    r'(?P<id>[A-Za-z0-9_-]{11})'
+)
+
+# Приложение, цикл событий и событие остановки main(); обработчик сигналов
+# только выставляет событие через call_soon_threadsafe, не запуская второй цикл
+application: Optional[Application] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+stop_signal: Optional[asyncio.Event] = None
+
+def _purge_directory(directory: str):
+    """Удаляет все файлы в директории за один проход scandir"""
     try:
-        logger.info("Stopping the bot...")
-        await application.stop()
-        await application.shutdown()
-    except Exception as e:
-        logger.error(f"Error stopping application: {e}")
+        entries = os.scandir(directory)
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                try:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(entry.path)
+                except OSError as e:
+                    logger.error(f"Error deleting {entry.path}: {e}")
 
-    # Cancel all running tasks
-    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
-    for task in tasks:
-        task.cancel()
-    
-    logger.info(f"Cancelling {len(tasks)} outstanding tasks...")
-    await asyncio.gather(*tasks, return_exceptions=True)
-    
-    loop.stop()
-    logger.info("Shutdown complete!")
+async def get_http_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию, создавая ее при первом обращении"""
+    global _http_session
+    if _http_session is None or _http_session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=10,
+            limit_per_host=10,
+            ttl_dns_cache=300,
+            keepalive_timeout=75
+        )
+        _http_session = aiohttp.ClientSession(connector=connector, read_bufsize=DOWNLOAD_CHUNK_SIZE)
+    return _http_session
+
+async def close_http_session():
+    """Закрывает общую HTTP-сессию"""
+    global _http_session
+    if _http_session is not None and not _http_session.closed:
+        await _http_session.close()
+    _http_session = None
+
+async def _pdf_dispatcher():
+    """Забирает из очереди все накопившиеся задания на PDF и распределяет их по пулу"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await _pdf_queue.get()]
+        while not _pdf_queue.empty():
+            batch.append(_pdf_queue.get_nowait())
+        for markdown_text, title, future in batch:
+            if future.cancelled():
+                continue
+            pdf_future = loop.run_in_executor(
+                _pdf_pool, functools.partial(generate_pdf, markdown_text, title=title, stream=True)
+            )
+            pdf_future.add_done_callback(functools.partial(_resolve_pdf_future, future))
+
+def _resolve_pdf_future(target: asyncio.Future, source: asyncio.Future):
+    """Переносит результат конвертации в future ожидающего обработчика"""
+    if target.cancelled():
+        return
+    if source.cancelled():
+        target.cancel()
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
 
-def handle_exception(loop, context):
-    """Handle exceptions in the event loop"""
-    msg = context.get("exception", context["message"])
-    logger.error(f"Caught exception: {msg}")
-    logger.info("Shutting down...")
-    asyncio.create_task(shutdown(signal.SIGINT, loop, application))
+async def render_pdf(markdown_text: str, title: str):
+    """Ставит генерацию PDF в очередь и возвращает BytesIO с готовым документом"""
+    global _pdf_queue, _pdf_dispatcher_task
+    if _pdf_queue is None:
+        _pdf_queue = asyncio.Queue()
+    if _pdf_dispatcher_task is None or _pdf_dispatcher_task.done():
+        _pdf_dispatcher_task = asyncio.create_task(_pdf_dispatcher())
+    future = asyncio.get_running_loop().create_future()
+    await _pdf_queue.put((markdown_text, title, future))
+    return await future
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
@@ -159,22 +267,14 @@ Note: If your video is too large, try:
 
 def extract_youtube_url(text: str) -> str:
     """Извлекает URL YouTube из текста"""
-    # Паттерны для различных форматов YouTube URL
-    youtube_patterns = [
-        r'(?:https?:\/\/)?(?:www\.)?(?:youtube\.com|youtu\.be)\/(?:watch\?v=)?([^\s&]+)',
-        r'(?:https?:\/\/)?(?:www\.)?youtube\.com\/shorts\/([^\s&]+)'
-    ]
-    
-    for pattern in youtube_patterns:
-        matches = re.finditer(pattern, text)
-        for match in matches:
-            # Возвращаем полный URL
-            full_match = match.group(0)
-            if 'youtu.be' in full_match:
-                return f'https://youtube.com/watch?v={match.group(1)}'
-            return full_match
-    
-    return None
+    # Быстрая проверка подстроки отсекает обычные сообщения без запуска regex
+    if 'youtu' not in text:
+        return None
+    match = _YOUTUBE_URL_RE.search(text)
+    if not match:
+        return None
+    # Возвращаем URL в каноническом виде
+    return f'https://youtube.com/watch?v={match.group("id")}'
 
 async def process_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process YouTube link and generate transcript"""
@@ -187,55 +287,171 @@ async def process_youtube_link(update: Update, context: ContextTypes.DEFAULT_TYP
             return
         
         await update.message.reply_text("Processing YouTube video... 🎥")
+        async with job_slot(update):
+            # Get video info
+            video_info = None
+            try:
+                video_info = await get_video_info(youtube_url)
+                info_message = format_video_info(video_info)
+                await update.message.reply_text(info_message)
+            except Exception as e:
+                logger.error(f"Error getting video info: {str(e)}")
+                await update.message.reply_text("📹 Ошибка\n\n"
+                                              "📺 Канал: Недоступно\n"
+                                              "⏱ Длительность: Недоступно\n"
+                                              "📅 Дата загрузки: Недоступно\n\n"
+                                              "📝 Описание:\n"
+                                              "Не удалось получить описание")
+
+            # Метаданные уже получены без скачивания: длинные видео отклоняем до загрузки
+            if video_info and video_info['duration_seconds'] > config.MAX_MEDIA_DURATION_SECONDS:
+                limit = timedelta(seconds=config.MAX_MEDIA_DURATION_SECONDS)
+                await update.message.reply_text(
+                    f"❌ Видео слишком длинное ({video_info['duration']}). Максимальная длительность: {limit}"
+                )
+                return
         
-        # Get video info
-        try:
-            video_info = await get_video_info(youtube_url)
-            info_message = format_video_info(video_info)
-            await update.message.reply_text(info_message)
-        except Exception as e:
-            logger.error(f"Error getting video info: {str(e)}")
-            await update.message.reply_text("📹 Ошибка\n\n"
-                                          "📺 Канал: Недоступно\n"
-                                          "⏱ Длительность: Недоступно\n"
-                                          "📅 Дата загрузки: Недоступно\n\n"
-                                          "📝 Описание:\n"
-                                          "Не удалось получить описание")
-        
-        # Download and process
-        audio_path = await download_youtube_audio(youtube_url)
-        if audio_path and os.path.exists(audio_path):
-            await process_audio_file(update, context, audio_path, is_youtube=True)
-        else:
-            raise Exception("Failed to download audio")
+            # Локальная модель получает звук прямо из потока: ffmpeg читает ссылку
+            # и отдает PCM 16 kHz в память, файл на диске не создается
+            stream_info = video_info and video_info.get('stream')
+            if config.USE_LOCAL_WHISPER and _direct_stream(stream_info):
+                try:
+                    audio = await decode_to_array(stream_info['url'], headers=_ffmpeg_headers(stream_info))
+                except Exception as e:
+                    logger.warning(f"Direct stream decoding failed, downloading audio instead: {e}")
+                else:
+                    await process_audio_file(update, context, None, is_youtube=True, video_info=video_info, audio=audio)
+                    return
+
+            # Download and process
+            # Повторно метаданные не запрашиваем, если ссылка на поток из get_video_info еще свежая
+            audio_path = await download_youtube_audio(youtube_url, stream_info)
+            if audio_path and os.path.exists(audio_path):
+                await process_audio_file(update, context, audio_path, is_youtube=True, video_info=video_info)
+            else:
+                raise Exception("Failed to download audio")
             
     except Exception as e:
         error_message = f"YouTube download error: {str(e)}"
         logger.error(f"Error processing YouTube link: {error_message}")
         await update.message.reply_text(f"Sorry, there was an error processing the YouTube link: {error_message}")
 
-async def download_youtube_audio(url: str) -> str:
-    """Download YouTube video and extract audio"""
+def _stream_fields(info: dict) -> dict:
+    """Выбирает из результата yt-dlp поля выбранного формата, нужные для прямой загрузки"""
+    return {
+        'url': info.get('url'),
+        'protocol': info.get('protocol'),
+        'http_headers': info.get('http_headers', {}),
+        'fetched_at': time.monotonic()
+    }
+
+def _blocking_extract(url: str, ydl_opts: dict) -> dict:
+    """Получает информацию о видео (блокирующий вызов, выполняется в пуле потоков)"""
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+def _blocking_download(url: str, ydl_opts: dict) -> str:
+    """Скачивает аудио и возвращает путь к mp3 (блокирующий вызов, выполняется в пуле потоков)"""
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=True)
+        return ydl.prepare_filename(info).rsplit('.', 1)[0] + '.mp3'
+
+# Самый легкий аудиопоток YouTube: все равно пережимается в моно 16 kHz
+YOUTUBE_AUDIO_FORMAT = 'bestaudio[abr<=64]/bestaudio/best'
+
+# Сколько секунд прямая ссылка на поток из метаданных считается пригодной для загрузки
+YOUTUBE_STREAM_URL_TTL = 60 * 60
+
+def _direct_stream(stream_info: Optional[dict]) -> bool:
+    """Проверяет, что поток можно читать ffmpeg напрямую: обычный HTTP(S) и ссылка еще свежая"""
+    return bool(
+        stream_info
+        and stream_info.get('url')
+        and stream_info.get('protocol') in ('http', 'https')
+        and time.monotonic() - stream_info['fetched_at'] <= YOUTUBE_STREAM_URL_TTL
+    )
+
+def _ffmpeg_headers(stream_info: dict) -> str:
+    """HTTP-заголовки yt-dlp в формате параметра -headers ffmpeg"""
+    return ''.join(f'{key}: {value}\r\n' for key, value in stream_info.get('http_headers', {}).items())
+
+async def _stream_to_mp3(stream_info: dict, output_path: str):
+    """Читает аудиопоток по прямой ссылке и за один проход ffmpeg пишет моно 16 kHz mp3"""
+    command = [
+        config.FFMPEG_EXECUTABLE,
+        '-threads', str(config.FFMPEG_THREADS),
+        '-v', 'error',
+        '-headers', _ffmpeg_headers(stream_info),
+        '-i', stream_info['url'],
+        '-vn',
+        '-acodec', 'libmp3lame',
+        '-ac', '1',
+        '-ar', '16000',
+        '-b:a', '64k',
+        '-y',
+        output_path
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    _, stderr = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg stream error: {stderr.decode(errors='replace')}")
+
+async def download_youtube_audio(url: str, stream_info: Optional[dict] = None) -> str:
+    """
+    Download YouTube video and extract audio.
+    
+    stream_info - выбранный аудиопоток из get_video_info; если ссылка устарела
+    или не передана, метаданные запрашиваются заново.
+    """
     try:
-        output_template = os.path.join(config.TEMP_DIRECTORY, '%(id)s.%(ext)s')
+        loop = asyncio.get_running_loop()
+
+        if not _direct_stream(stream_info):
+            info = await loop.run_in_executor(
+                _ytdlp_executor,
+                functools.partial(_blocking_extract, url, {
+                    'format': YOUTUBE_AUDIO_FORMAT,
+                    'quiet': True,
+                    'no_warnings': True,
+                    'noplaylist': True
+                })
+            )
+            stream_info = _stream_fields(info)
+
+        # Для обычного HTTP-потока ffmpeg читает его напрямую по ссылке из метаданных,
+        # без промежуточного файла webm/m4a и второго прохода FFmpegExtractAudio
+        if _direct_stream(stream_info):
+            audio_path = os.path.join(config.TEMP_DIRECTORY, f'{temp_name("youtube")}.mp3')
+            try:
+                await _stream_to_mp3(stream_info, audio_path)
+                return audio_path
+            except Exception as e:
+                logger.warning(f"Direct stream conversion failed, falling back to yt-dlp download: {e}")
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(audio_path)
+
+        # Фрагментированные потоки (DASH/HLS) скачивает сам yt-dlp
+        output_template = os.path.join(config.TEMP_DIRECTORY, f'{temp_name("youtube")}.%(ext)s')
         ydl_opts = {
-            'format': 'bestaudio/best',
+            'format': YOUTUBE_AUDIO_FORMAT,
             'postprocessors': [{
                 'key': 'FFmpegExtractAudio',
                 'preferredcodec': 'mp3',
-                'preferredquality': '192',
+                'preferredquality': '64',
             }],
+            # Сразу получаем моно 16 kHz, чтобы не пережимать файл перед транскрибацией
+            'postprocessor_args': {'extractaudio': ['-ac', '1', '-ar', '16000']},
             'outtmpl': output_template,
             'quiet': True,
-            'no_warnings': True
+            'no_warnings': True,
+            'noprogress': True
         }
         
-        async with aiofiles.tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_path = temp_file.name
-            
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            audio_path = ydl.prepare_filename(info).rsplit('.', 1)[0] + '.mp3'
+        audio_path = await loop.run_in_executor(
+            _ytdlp_executor, functools.partial(_blocking_download, url, ydl_opts)
+        )
             
         return audio_path
         
@@ -243,29 +459,104 @@ async def download_youtube_audio(url: str) -> str:
         logger.error(f"Error downloading YouTube audio: {str(e)}")
         raise
 
+@contextlib.asynccontextmanager
+async def job_slot(update: Update):
+    """Занимает слот обработки; если все слоты заняты, сообщает пользователю позицию в очереди"""
+    global _queued_jobs
+    if JOB_GATE.locked():
+        _queued_jobs += 1
+        try:
+            await update.message.reply_text(f"⏳ Задание в очереди (позиция {_queued_jobs})...")
+            await JOB_GATE.acquire()
+        finally:
+            _queued_jobs -= 1
+    else:
+        await JOB_GATE.acquire()
+    try:
+        yield
+    finally:
+        JOB_GATE.release()
+
+def per_chat(handler):
+    """
+    Ставит обновление в очередь его чата вместо немедленной обработки.
+    
+    Обновления одного чата обрабатываются по порядку отдельной задачей-воркером,
+    а воркеры разных чатов работают параллельно, поэтому долгая транскрибация
+    в одном чате не задерживает остальные.
+    """
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat_id = update.effective_chat.id
+        chat_queues = context.bot_data.setdefault("chat_workers", {})
+        chat_queue = chat_queues.get(chat_id)
+        if chat_queue is None:
+            chat_queue = chat_queues[chat_id] = asyncio.Queue()
+            context.application.create_task(_chat_worker(chat_id, chat_queues, chat_queue), update=update)
+        chat_queue.put_nowait((handler, update, context))
+    return wrapper
+
+async def _chat_worker(chat_id: int, chat_queues: dict, chat_queue: asyncio.Queue):
+    """Последовательно обрабатывает очередь чата и завершается, когда она опустеет"""
+    try:
+        while True:
+            try:
+                handler, update, context = chat_queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            try:
+                await handler(update, context)
+            except Exception as e:
+                logger.error(f"Error in {handler.__name__} for chat {chat_id}: {str(e)}", exc_info=True)
+    finally:
+        # Между проверкой очереди и удалением нет await, поэтому новое обновление
+        # либо попадет в эту очередь до выхода, либо создаст нового воркера
+        chat_queues.pop(chat_id, None)
+
+def _video_cache_key(url: str) -> str:
+    """Возвращает ID видео, чтобы разные формы ссылки (youtu.be, shorts, watch) давали один ключ"""
+    match = _YOUTUBE_URL_RE.search(url)
+    return match.group('id') if match else url
+
 async def get_video_info(url: str) -> dict:
     """Get YouTube video information"""
+    cache_key = _video_cache_key(url)
+    cached = _video_info_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     ydl_opts = {
         'quiet': True,
         'no_warnings': True,
-        'extract_flat': True
+        'skip_download': True,
+        'noplaylist': True,
+        'simulate': True,
+        # Формат выбирается сразу, чтобы ссылку на аудиопоток можно было использовать для загрузки
+        'format': YOUTUBE_AUDIO_FORMAT,
     }
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url, download=False)
-            return {
-                'title': info.get('title', 'Недоступно'),
-                'channel': info.get('uploader', 'Недоступно'),
-                'duration': str(timedelta(seconds=info.get('duration', 0))),
-                'upload_date': datetime.strptime(
-                    str(info.get('upload_date', '20240101')), '%Y%m%d'
-                ).strftime('%d.%m.%Y'),
-                'description': info.get('description', 'Не удалось получить описание')
-            }
-        except Exception as e:
-            logger.error(f"Error extracting video info: {str(e)}")
-            raise
+    try:
+        loop = asyncio.get_running_loop()
+        info = await loop.run_in_executor(
+            _ytdlp_executor, functools.partial(_blocking_extract, url, ydl_opts)
+        )
+        # upload_date приходит в виде YYYYMMDD, разбор через strptime не нужен
+        raw_date = str(info.get('upload_date') or '20240101')
+        upload_date = f"{raw_date[6:8]}.{raw_date[4:6]}.{raw_date[:4]}" if len(raw_date) == 8 else 'Недоступно'
+        video_info = {
+            'title': info.get('title', 'Недоступно'),
+            'channel': info.get('uploader', 'Недоступно'),
+            'duration': str(timedelta(seconds=info.get('duration', 0))),
+            'duration_seconds': info.get('duration') or 0,
+            'upload_date': upload_date,
+            'description': info.get('description', 'Не удалось получить описание'),
+            'stream': _stream_fields(info)
+        }
+        _video_info_cache.set(cache_key, video_info)
+        return video_info
+    except Exception as e:
+        logger.error(f"Error extracting video info: {str(e)}")
+        raise
 
 def format_video_info(info: dict) -> str:
     """Format video information for display"""
@@ -277,6 +568,27 @@ def format_video_info(info: dict) -> str:
         f"📝 Описание:\n{info['description']}"
     )
 
+def _validate_media(file_obj, formats, mime_prefix: str) -> Optional[str]:
+    """
+    Проверяет расширение, MIME-тип и длительность по метаданным Telegram до загрузки файла.
+    Возвращает текст ошибки или None, если файл можно обрабатывать.
+    """
+    file_name = getattr(file_obj, 'file_name', None)
+    if file_name:
+        extension = os.path.splitext(file_name)[1].lower()
+        if extension not in formats:
+            return f"❌ Формат {extension or 'без расширения'} не поддерживается. Поддерживаемые форматы: {', '.join(formats)}"
+    mime_type = getattr(file_obj, 'mime_type', None)
+    if mime_type and not mime_type.startswith(mime_prefix):
+        return f"❌ Неподдерживаемый тип файла: {mime_type}"
+    duration = getattr(file_obj, 'duration', None) or 0
+    if duration > config.MAX_MEDIA_DURATION_SECONDS:
+        return (
+            f"❌ Запись слишком длинная ({timedelta(seconds=duration)}). "
+            f"Максимальная длительность: {timedelta(seconds=config.MAX_MEDIA_DURATION_SECONDS)}"
+        )
+    return None
+
 async def process_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Process uploaded video files."""
     video_path = None
@@ -309,39 +621,47 @@ async def process_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             await update.message.reply_text(message)
             return
+
+        validation_error = _validate_media(update.message.video, config.VIDEO_FORMATS, 'video/')
+        if validation_error:
+            await update.message.reply_text(validation_error)
+            return
             
         await update.message.reply_text("Обработка видео файла... 🎥")
+        async with job_slot(update):
+            # Download file
+            async with _file_fetch_limiter:
+                file = await context.bot.get_file(update.message.video.file_id)
+            video_path = os.path.join(config.TEMP_DIRECTORY, f"video_{update.message.video.file_id}")
+            await download_telegram_file(file, video_path)
         
-        # Download file
-        file = await context.bot.get_file(update.message.video.file_id)
-        video_path = os.path.join(config.TEMP_DIRECTORY, f"video_{update.message.video.file_id}")
-        await file.download_to_drive(video_path)
-        
-        # Extract audio and process
-        audio_path = audio_processor.extract_audio(video_path)
-        
-        # Проверяем размер аудио файла
-        audio_size_mb = os.path.getsize(audio_path) / (1024 * 1024)  # Convert to MB
-        if audio_size_mb > MAX_AUDIO_SIZE_MB:
-            raise Exception(
-                f"Извлеченное аудио слишком большое ({audio_size_mb:.1f}MB). "
-                f"Максимально допустимый размер {MAX_AUDIO_SIZE_MB}MB. "
-                "Попробуйте использовать видео меньшей длительности или качествa."
-            )
+            # Локальная модель декодирует звук из видео сразу в 16 kHz моно в памяти,
+            # промежуточный mp3 нужен только для облачного API
+            if config.USE_LOCAL_WHISPER:
+                await process_audio_file(update, context, video_path)
+                return
+
+            # Extract audio and process
+            # Вызовы ffmpeg в AudioProcessor блокирующие, поэтому выполняются вне цикла событий
+            audio_path = await asyncio.to_thread(context.bot_data["media"].extract_audio, video_path)
+        
+            # Проверяем размер аудио файла
+            audio_size_mb = os.path.getsize(audio_path) / (1024 * 1024)  # Convert to MB
+            if audio_size_mb > MAX_AUDIO_SIZE_MB:
+                raise Exception(
+                    f"Извлеченное аудио слишком большое ({audio_size_mb:.1f}MB). "
+                    f"Максимально допустимый размер {MAX_AUDIO_SIZE_MB}MB. "
+                    "Попробуйте использовать видео меньшей длительности или качествa."
+                )
         
-        await process_audio_file(update, context, audio_path)
+            await process_audio_file(update, context, audio_path)
         
     except Exception as e:
         logger.error(f"Error processing video: {str(e)}")
         await update.message.reply_text(f"Извините, произошла ошибка при обработке видео: {str(e)}")
     finally:
         # Cleanup
-        for path in [video_path, compressed_path, audio_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                except Exception as e:
-                    logger.error(f"Error cleaning up file {path}: {str(e)}")
+        await cleanup_files([video_path, compressed_path, audio_path])
 
 async def process_audio_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обрабатывает аудио сообщения (аудио файлы и голосовые сообщения)"""
@@ -389,44 +709,52 @@ async def process_audio_message(update: Update, context: ContextTypes.DEFAULT_TY
             )
             await update.message.reply_text(message)
             return
+
+        validation_error = _validate_media(file_obj, config.AUDIO_FORMATS, 'audio/')
+        if validation_error:
+            await update.message.reply_text(validation_error)
+            return
         
         await update.message.reply_text(f"Обработка {file_type}... 🎵")
-        
-        # Загружаем файл
-        try:
-            audio_path = os.path.join(config.TEMP_DIRECTORY, f"audio_{file_obj.file_id}")
-            file = await context.bot.get_file(file_obj.file_id)
-            await file.download_to_drive(audio_path)
-            logger.info("Загрузка файла успешна")
-        except Exception as download_error:
-            error_message = str(download_error)
-            logger.error(f"Ошибка при загрузке файла: {error_message}")
+        async with job_slot(update):
+            # Загружаем файл
+            try:
+                audio_path = os.path.join(config.TEMP_DIRECTORY, f"audio_{file_obj.file_id}")
+                async with _file_fetch_limiter:
+                    file = await context.bot.get_file(file_obj.file_id)
+                await download_telegram_file(file, audio_path)
+                logger.info("Загрузка файла успешна")
+            except Exception as download_error:
+                error_message = str(download_error)
+                logger.error(f"Ошибка при загрузке файла: {error_message}")
             
-            if "File is too big" in error_message:
-                await update.message.reply_text(
-                    f"❌ Не удалось загрузить файл размером {file_size_mb:.1f}MB.\n"
-                    f"Telegram ограничивает размер файла до {config.TELEGRAM_SIZE_LIMIT_MB}MB.\n"
-                    "Пожалуйста, сожмите файл или разделите его на части."
-                )
-            else:
-                await update.message.reply_text(
-                    f"❌ Произошла ошибка при загрузке файла:\n{error_message}"
-                )
-            return
+                if "File is too big" in error_message:
+                    await update.message.reply_text(
+                        f"❌ Не удалось загрузить файл размером {file_size_mb:.1f}MB.\n"
+                        f"Telegram ограничивает размер файла до {config.TELEGRAM_SIZE_LIMIT_MB}MB.\n"
+                        "Пожалуйста, сожмите файл или разделите его на части."
+                    )
+                else:
+                    await update.message.reply_text(
+                        f"❌ Произошла ошибка при загрузке файла:\n{error_message}"
+                    )
+                return
         
-        # Проверяем успешность загрузки
-        if os.path.exists(audio_path):
-            actual_size_mb = os.path.getsize(audio_path) / (1024 * 1024)
-            logger.info(f"Файл успешно загружен, размер: {actual_size_mb:.1f}MB")
-            
-            # Обрабатываем аудио
-            processed_path = audio_processor.process_audio_message(audio_path)
-            logger.info("Аудио успешно обработано")
+            # Проверяем успешность загрузки
+            if os.path.exists(audio_path):
+                actual_size_mb = os.path.getsize(audio_path) / (1024 * 1024)
+                logger.info(f"Файл успешно загружен, размер: {actual_size_mb:.1f}MB")
             
-            # Транскрибируем
-            await process_audio_file(update, context, processed_path)
-        else:
-            raise Exception("Файл не был загружен")
+                # Для облачного API аудио пережимается в mp3; локальная модель
+                # декодирует исходный файл в 16 kHz моно сама, без промежуточного файла
+                if config.USE_LOCAL_WHISPER:
+                    await process_audio_file(update, context, audio_path)
+                else:
+                    processed_path = await asyncio.to_thread(context.bot_data["media"].process_audio_message, audio_path)
+                    logger.info("Аудио успешно обработано")
+                    await process_audio_file(update, context, processed_path)
+            else:
+                raise Exception("Файл не был загружен")
         
     except Exception as e:
         error_message = str(e)
@@ -436,35 +764,39 @@ async def process_audio_message(update: Update, context: ContextTypes.DEFAULT_TY
         )
     finally:
         # Очистка
-        for path in [audio_path, processed_path]:
-            if path and os.path.exists(path):
-                try:
-                    os.remove(path)
-                    logger.info(f"Удален временный файл: {path}")
-                except Exception as e:
-                    logger.error(f"Ошибка при очистке файла {path}: {str(e)}")
+        await cleanup_files([audio_path, processed_path])
 
 def get_file_creation_time(file_path: str) -> str:
     """Получает время создания файла в формате DD-MM-YYYY HH-mm-ss"""
     try:
-        # Для Windows используем время создания
-        if os.name == 'nt':
-            timestamp = os.path.getctime(file_path)
-        # Для Unix-подобных систем используем время последнего изменения
-        else:
-            timestamp = os.path.getmtime(file_path)
+        st = os.stat(file_path)
+        # Для Windows используем время создания,
+        # для Unix-подобных систем - время последнего изменения
+        timestamp = st.st_ctime if os.name == 'nt' else st.st_mtime
         
         return datetime.fromtimestamp(timestamp).strftime("%d-%m-%Y %H-%M-%S")
     except Exception as e:
         logger.error(f"Error getting file creation time: {str(e)}")
         return datetime.now().strftime("%d-%m-%Y %H-%M-%S")
 
-async def process_audio_file(update: Update, context: ContextTypes.DEFAULT_TYPE, audio_path, is_youtube=False):
-    """Process audio file and generate notes"""
+async def process_audio_file(update: Update, context: ContextTypes.DEFAULT_TYPE, audio_path, is_youtube=False, video_info=None, audio=None):
+    """
+    Process audio file and generate notes.
+    
+    audio - уже декодированный массив 16 kHz моно (для локальной модели); в этом случае
+    audio_path может быть None.
+    """
     temp_files = [audio_path]  # Keep track of files to clean up
+    transcriber = context.bot_data["tx"]
     try:
+        # Одно статусное сообщение обновляется по ходу обработки вместо серии ответов
+        status = await update.message.reply_text("⏳ Preparing audio...")
+        
         # Получаем время создания файла
-        file_timestamp = get_file_creation_time(audio_path)
+        file_timestamp = (
+            get_file_creation_time(audio_path) if audio_path
+            else datetime.now().strftime("%d-%m-%Y %H-%M-%S")
+        )
         
         if not is_youtube:
             audio_info = {
@@ -476,12 +808,14 @@ async def process_audio_file(update: Update, context: ContextTypes.DEFAULT_TYPE,
                 'original_description': 'No description available'
             }
         else:
-            # Get video info
+            # Get video info (повторно не запрашиваем, если уже получена)
             try:
-                video_info = await get_video_info(extract_youtube_url(update.message.text))
+                youtube_url = extract_youtube_url(update.message.text)
+                if video_info is None:
+                    video_info = await get_video_info(youtube_url)
                 audio_info = {
                     'title': f'{video_info["title"]} ({file_timestamp})',
-                    'video_url': extract_youtube_url(update.message.text),
+                    'video_url': youtube_url,
                     'channel': video_info['channel'],
                     'duration': video_info['duration'],
                     'process_date': time.strftime("%d.%m.%Y"),
@@ -498,74 +832,207 @@ async def process_audio_file(update: Update, context: ContextTypes.DEFAULT_TYPE,
                     'original_description': 'No description available'
                 }
 
-        # Оптимизируем аудио файл перед транскрибацией
-        try:
-            optimized_audio_path, optimization_info = audio_processor.optimize_audio_file(
-                input_path=audio_path, 
-                output_path=f"{audio_path}_optimized.mp3", 
-                target_size_mb=20.0
-            )
-            
-            # Заменяем оригинальный путь на оптимизированный
-            temp_files.append(optimized_audio_path)
-            audio_path = optimized_audio_path
-            
-            logger.info(f"Audio optimized successfully: {optimized_audio_path}")
-            logger.info(f"Optimization details: {optimization_info}")
-        except Exception as e:
-            logger.error(f"Audio optimization failed: {e}")
-            # В случае ошибки оптимизации используем оригинальный файл
+        # Транскрипции кэшируются по содержимому аудио, чтобы повторные загрузки не распознавались заново
+        if audio is None:
+            cache_key = await asyncio.to_thread(_audio_digest, audio_path)
+        else:
+            cache_key = await asyncio.to_thread(_array_digest, audio)
+        transcript = await asyncio.to_thread(_load_cached_transcript, cache_key)
+        content_task = None
+        if transcript is not None:
+            logger.info(f"Using cached transcript for {audio_path}")
+        else:
+            # Лимит размера есть только у облачного API; для локальной модели аудио
+            # декодируется ffmpeg прямо в память, без оптимизации и промежуточных файлов
+            if not config.USE_LOCAL_WHISPER:
+                target_size_mb = 20.0
+                if os.path.getsize(audio_path) <= target_size_mb * 1024 * 1024:
+                    logger.info(f"Audio already within {target_size_mb} MB, skipping optimization")
+                else:
+                    try:
+                        optimized_audio_path, optimization_info = await asyncio.to_thread(
+                            context.bot_data["media"].optimize_audio_file,
+                            input_path=audio_path, 
+                            output_path=f"{audio_path}_optimized.mp3", 
+                            target_size_mb=target_size_mb
+                        )
+                
+                        # Заменяем оригинальный путь на оптимизированный
+                        temp_files.append(optimized_audio_path)
+                        audio_path = optimized_audio_path
+                
+                        logger.info(f"Audio optimized successfully: {optimized_audio_path}")
+                        logger.info(f"Optimization details: {optimization_info}")
+                    except Exception as e:
+                        logger.error(f"Audio optimization failed: {e}")
+                        # В случае ошибки оптимизации используем оригинальный файл
         
-        # Транскрибируем аудио
-        await update.message.reply_text("Transcribing audio... 🎯")
-        transcript = transcriber.transcribe_with_whisper(audio_path)
+            # Транскрибируем аудио
+            await status.edit_text("Transcribing audio... 🎯")
+            loop = asyncio.get_running_loop()
+            # Локальной модели передается уже декодированный массив 16 kHz моно
+            if audio is None:
+                audio = await decode_to_array(audio_path) if config.USE_LOCAL_WHISPER else audio_path
+            # Тип контента определяется по началу текста, поэтому запрос анализа уходит, как только
+            # локальная модель распознала первые символы, и выполняется параллельно с остальным аудио
+            prefix_ready = loop.create_future()
 
-        # Анализируем тип контента
-        content_type = transcriber.analyze_content_type(transcript)
+            def _on_prefix(prefix):
+                loop.call_soon_threadsafe(lambda: prefix_ready.done() or prefix_ready.set_result(prefix))
+
+            async def _analyze_prefix():
+                return await asyncio.to_thread(transcriber.analyze_content_type, await prefix_ready)
+
+            content_task = asyncio.create_task(_analyze_prefix())
+            try:
+                transcript = await loop.run_in_executor(
+                    _whisper_pool, functools.partial(transcriber.transcribe_with_whisper, audio, on_prefix=_on_prefix)
+                )
+            except BaseException:
+                content_task.cancel()
+                raise
+            # Короткая транскрипция (или облачный API) не вызывает on_prefix: анализируем текст целиком
+            if not prefix_ready.done():
+                prefix_ready.set_result(transcript)
+            await asyncio.to_thread(_store_cached_transcript, cache_key, transcript)
+
+        # Анализируем тип контента (если он не был запущен во время распознавания)
+        if content_task is None:
+            content_task = asyncio.create_task(asyncio.to_thread(transcriber.analyze_content_type, transcript))
+        content_type = await content_task
 
         # Генерируем заметки
-        await update.message.reply_text("Generating notes... 📝")
-        notes = transcriber.generate_notes(transcript, content_type, audio_info)
-
-        # Отправляем заметки
-        await update.message.reply_text("Sending notes... 📤")
-        await telegram_sender.send_notes(
-            chat_id=update.effective_chat.id,
-            notes=notes,
-            title=audio_info.get('title', 'Notes')
-        )
+        await status.edit_text("Generating notes... 📝")
+        notes = await asyncio.to_thread(transcriber.generate_notes, transcript, content_type, audio_info)
 
-        # Генерируем PDF
-        await update.message.reply_text("Generating PDF... 📄")
-        pdf_path = generate_pdf(notes, title=audio_info.get('title', 'Notes').replace('/', '_'))
-        temp_files.append(pdf_path)
-        
-        # Отправляем PDF
-        await update.message.reply_text("Sending PDF... 📎")
-        await telegram_sender.send_document(pdf_path, update.effective_chat.id, update)
+        # Отправляем заметки и параллельно генерируем PDF в пуле конвертации;
+        # send_notes дожидается этой задачи после текста и отправляет единственный PDF
+        await status.edit_text("Sending notes and generating PDF... 📤📄")
+        pdf_task = asyncio.create_task(
+            render_pdf(notes, audio_info.get('title', 'Notes').replace('/', '_'))
+        )
+        # PDF формируется в памяти, поэтому на диске ничего не остается
+        try:
+            await telegram_sender.send_notes(
+                chat_id=update.effective_chat.id,
+                notes=notes,
+                title=audio_info.get('title', 'Notes'),
+                pdf=pdf_task
+            )
+        finally:
+            # Если отправка текста упала раньше, чем дошла до PDF, задача не нужна
+            pdf_task.cancel()
 
-        await update.message.reply_text("Done! 🎉")
+        await status.edit_text("Done! 🎉")
 
     except Exception as e:
         logging.error(f"Error processing audio: {str(e)}")
         await update.message.reply_text(f"Sorry, an error occurred while processing the audio: {str(e)}")
     finally:
         # Clean up all temporary files
-        cleanup_files(temp_files)
+        await cleanup_files(temp_files)
 
-def cleanup_files(file_paths):
-    """Clean up temporary files"""
-    for path in file_paths:
-        if path and os.path.exists(path):
-            try:
-                os.remove(path)
-                logger.info(f"Cleaned up file: {path}")
-            except Exception as e:
-                logger.error(f"Error cleaning up file {path}: {str(e)}")
+def _audio_digest(file_path: str) -> str:
+    """Вычисляет хэш содержимого аудио файла (читает блоками по 1 MiB)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _array_digest(audio) -> str:
+    """Вычисляет хэш декодированного аудио (массив NumPy отдает буфер без копирования)"""
+    return hashlib.blake2b(memoryview(audio), digest_size=16).hexdigest()
+
+def _load_cached_transcript(cache_key: str) -> Optional[str]:
+    """Возвращает транскрипцию из кэша, если она есть и не устарела"""
+    cache_path = os.path.join(config.TRANSCRIPT_CACHE_DIRECTORY, f"{cache_key}.txt")
+    try:
+        if time.time() - os.stat(cache_path).st_mtime > config.TRANSCRIPT_CACHE_TTL:
+            return None
+        return Path(cache_path).read_text(encoding='utf-8')
+    except OSError:
+        return None
+
+def _store_cached_transcript(cache_key: str, transcript: str):
+    """Сохраняет транскрипцию в кэш"""
+    cache_path = os.path.join(config.TRANSCRIPT_CACHE_DIRECTORY, f"{cache_key}.txt")
+    try:
+        Path(cache_path).write_text(transcript, encoding='utf-8')
+    except OSError as e:
+        logger.warning(f"Failed to cache transcript: {e}")
+
+async def _remove_file(path: str):
+    """
+    Удаляет файл; в Windows файл, еще открытый другим процессом (ffmpeg, антивирус),
+    нельзя удалить, поэтому PermissionError повторяется с растущей паузой.
+    """
+    for delay in (0.05, 0.1, 0.2, 0.4, 0.8):
+        try:
+            await aiofiles.os.remove(path)
+            return
+        except PermissionError:
+            await asyncio.sleep(delay)
+    await aiofiles.os.remove(path)
+
+async def cleanup_files(file_paths):
+    """Clean up temporary files concurrently without blocking the event loop"""
+    # Существование заранее не проверяем: отсутствующий файл - это FileNotFoundError при удалении
+    paths = [path for path in dict.fromkeys(file_paths) if path]
+    results = await asyncio.gather(
+        *(_remove_file(path) for path in paths),
+        return_exceptions=True
+    )
+    for path, result in zip(paths, results):
+        if isinstance(result, FileNotFoundError):
+            continue
+        if isinstance(result, Exception):
+            logger.error(f"Error cleaning up file {path}: {str(result)}")
+        else:
+            logger.info(f"Cleaned up file: {path}")
+
+async def download_telegram_file(file, destination: str, bot_token: str = None):
+    """
+    Скачивает файл Telegram потоково через общую aiohttp-сессию блоками по DOWNLOAD_CHUNK_SIZE.
+    
+    Args:
+        file: Объект telegram.File, полученный через get_file
+        destination: Путь для сохранения файла
+        bot_token: Токен бота (нужен, только если file_path относительный)
+    
+    Raises:
+        Exception: Если сервер вернул ошибку
+    """
+    # В python-telegram-bot 20 file_path уже содержит полный URL
+    if file.file_path.startswith(('http://', 'https://')):
+        download_url = file.file_path
+    else:
+        download_url = f"https://api.telegram.org/file/bot{bot_token or config.TRANSCRIPT_BOT_TOKEN}/{file.file_path}"
+    
+    session = await get_http_session()
+    async with session.get(download_url, timeout=aiohttp.ClientTimeout(total=300)) as response:
+        if response.status != 200:
+            response_text = await response.text()
+            raise Exception(f"HTTP {response.status}: {response_text}")
+        
+        total_size = int(response.headers.get('content-length', 0))
+        bytes_downloaded = 0
+        chunks_downloaded = 0
+        
+        async with aiofiles.open(destination, 'wb') as f:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                await f.write(chunk)
+                bytes_downloaded += len(chunk)
+                chunks_downloaded += 1
+                if total_size and chunks_downloaded % DOWNLOAD_PROGRESS_EVERY == 0:
+                    progress = (bytes_downloaded / total_size) * 100
+                    logger.info(f"Загружено: {bytes_downloaded/(1024*1024):.1f}MB ({progress:.1f}%)")
+    
+    logger.info(f"Файл успешно загружен: {destination}")
 
 async def download_large_file(file_id: str, bot_token: str, destination: str, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """
-    Загружает большой файл напрямую через multipart/form-data.
+    Загружает большой файл напрямую через HTTP.
     
     Args:
         file_id: ID файла в Telegram
@@ -579,44 +1046,30 @@ async def download_large_file(file_id: str, bot_token: str, destination: str, co
     try:
         # Используем python-telegram-bot для получения информации о файле
         logger.info(f"Получаем информацию о файле с ID: {file_id}")
-        file = await context.bot.get_file(file_id)
-        file_path = file.file_path
-        logger.info(f"Получен путь к файлу: {file_path}")
-        
-        # Загружаем файл напрямую
-        download_url = f"https://api.telegram.org/file/bot{bot_token}/{file_path}"
-        logger.info(f"Загружаем файл с URL: {download_url}")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(download_url, timeout=aiohttp.ClientTimeout(total=300)) as response:
-                if response.status == 200:
-                    total_size = int(response.headers.get('content-length', 0))
-                    bytes_downloaded = 0
-                    
-                    with open(destination, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            if chunk:
-                                f.write(chunk)
-                                bytes_downloaded += len(chunk)
-                                progress = (bytes_downloaded / total_size) * 100 if total_size else 0
-                                if total_size and bytes_downloaded % (1024 * 1024) == 0:  # Логируем каждый МБ
-                                    logger.info(f"Загружено: {bytes_downloaded/(1024*1024):.1f}MB ({progress:.1f}%)")
-                    
-                    logger.info(f"Файл успешно загружен: {destination}")
-                    return True
-                else:
-                    response_text = await response.text()
-                    logger.error(f"Ошибка загрузки файла: HTTP {response.status}, {response_text}")
-                    return False
+        async with _file_fetch_limiter:
+            file = await context.bot.get_file(file_id)
+        logger.info(f"Получен путь к файлу: {file.file_path}")
+        
+        await download_telegram_file(file, destination, bot_token)
+        return True
                     
     except Exception as e:
         logger.error(f"Ошибка при загрузке файла: {str(e)}")
         return False
 
+async def _get_me_cached(bot, ttl: float = 3600) -> Any:
+    """Возвращает информацию о боте, запрашивая get_me не чаще раза в ttl секунд"""
+    global _bot_me_cache
+    if _bot_me_cache and time.monotonic() - _bot_me_cache[0] < ttl:
+        return _bot_me_cache[1]
+    bot_info = await bot.get_me()
+    _bot_me_cache = (time.monotonic(), bot_info)
+    return bot_info
+
 async def check_bot_premium(context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Проверяет, имеет ли бот Premium статус"""
     try:
-        bot_info = await context.bot.get_me()
+        bot_info = await _get_me_cached(context.bot)
         is_premium = getattr(bot_info, 'is_premium', False)
         logger.info(f"Bot Premium status: {is_premium}")
         return is_premium
@@ -624,10 +1077,14 @@ async def check_bot_premium(context: ContextTypes.DEFAULT_TYPE) -> bool:
         logger.error(f"Error checking bot premium status: {e}")
         return False
 
+async def cleanup_stale_temp_files(context: ContextTypes.DEFAULT_TYPE):
+    """Удаляет временные файлы старше TEMP_FILE_MAX_AGE_HOURS (один проход scandir в отдельном потоке)"""
+    await asyncio.to_thread(context.bot_data["media"].cleanup_temp_files, config.TEMP_FILE_MAX_AGE_HOURS)
+
 async def update_size_limits(context: ContextTypes.DEFAULT_TYPE):
     """Обновляет лимиты размера файлов на основе Premium статуса бота"""
     try:
-        bot_info = await context.bot.get_me()
+        bot_info = await _get_me_cached(context.bot)
         is_premium = bot_info.is_premium if hasattr(bot_info, 'is_premium') else False
         
         # Устанавливаем значения по умолчанию
@@ -651,11 +1108,12 @@ async def update_size_limits(context: ContextTypes.DEFAULT_TYPE):
         config.MAX_AUDIO_SIZE_MB = 25
         config.TELEGRAM_SIZE_LIMIT_MB = 25
 
+@functools.lru_cache(maxsize=1)
 def check_requirements():
     """Проверяет наличие всех необходимых Python пакетов"""
     logger = logging.getLogger(__name__)
     
-    logger.info("\n📦 Проверка Python пакетов:")
+    lines = ["\n📦 Проверка Python пакетов:"]
     missing_packages = []
     outdated_packages = []
     
@@ -668,7 +1126,7 @@ def check_requirements():
         'pydub': '0.25.1',
         'markdown': '3.4.4',
         'Markdown': '3.4.4',
-        'whisper': '1.1.10',
+        'faster-whisper': '1.1.0',
         'torch': '2.0.1',
         'numpy': '1.24.3',
         'pandas': '2.0.3',
@@ -676,52 +1134,93 @@ def check_requirements():
         'wmi': '1.5.1'
     }
     
-    import pkg_resources
+    from importlib.metadata import version, PackageNotFoundError
+    from packaging.version import Version
     
     for package, required_version in required_packages.items():
         try:
-            installed = pkg_resources.get_distribution(package)
-            installed_version = installed.version
-            required_version_parsed = pkg_resources.parse_version(required_version)
-            installed_version_parsed = pkg_resources.parse_version(installed_version)
+            installed_version = version(package)
             
-            if installed_version_parsed >= required_version_parsed:
-                logger.info(f"✅ {package:<20} установлен {installed_version:<10} (мин. {required_version})")
+            if Version(installed_version) >= Version(required_version):
+                lines.append(f"✅ {package:<20} установлен {installed_version:<10} (мин. {required_version})")
             else:
-                logger.info(f"⚠️ {package:<20} установлен {installed_version:<10} (требуется {required_version})")
+                lines.append(f"⚠️ {package:<20} установлен {installed_version:<10} (требуется {required_version})")
                 outdated_packages.append(f"{package}>={required_version}")
-        except pkg_resources.DistributionNotFound:
-            logger.info(f"❌ {package:<20} не установлен              (требуется {required_version})")
+        except PackageNotFoundError:
+            lines.append(f"❌ {package:<20} не установлен              (требуется {required_version})")
             missing_packages.append(f"{package}>={required_version}")
     
+    logger.info("\n".join(lines))
+    
     if missing_packages or outdated_packages:
-        logger.warning("\n⚠️ Необходимые действия:")
+        warnings = ["\n⚠️ Необходимые действия:"]
         
         if missing_packages:
             install_cmd = "pip install " + " ".join(missing_packages)
-            logger.warning("\n📥 Установка отсутствующих пакетов:")
-            logger.warning(f"  └─ {install_cmd}")
+            warnings += ["\n📥 Установка отсутствующих пакетов:", f"  └─ {install_cmd}"]
         
         if outdated_packages:
             upgrade_cmd = "pip install --upgrade " + " ".join(outdated_packages)
-            logger.warning("\n⬆️ Обновление устаревших пакетов:")
-            logger.warning(f"  └─ {upgrade_cmd}")
+            warnings += ["\n⬆️ Обновление устаревших пакетов:", f"  └─ {upgrade_cmd}"]
         
+        logger.warning("\n".join(warnings))
         return False
     
     logger.info("\n✅ Все пакеты установлены и соответствуют требуемым версиям")
     return True
 
+@functools.lru_cache(maxsize=1)
+def _memory_info() -> tuple:
+    """
+    Возвращает (всего байт, доступно байт, процент использования) оперативной памяти.
+    
+    В Windows используется один вызов GlobalMemoryStatusEx, в Linux - чтение
+    /proc/meminfo; psutil импортируется только на остальных системах.
+    """
+    if config.IS_WINDOWS:
+        import ctypes
+        
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [
+                ('dwLength', ctypes.c_ulong),
+                ('dwMemoryLoad', ctypes.c_ulong),
+                ('ullTotalPhys', ctypes.c_ulonglong),
+                ('ullAvailPhys', ctypes.c_ulonglong),
+                ('ullTotalPageFile', ctypes.c_ulonglong),
+                ('ullAvailPageFile', ctypes.c_ulonglong),
+                ('ullTotalVirtual', ctypes.c_ulonglong),
+                ('ullAvailVirtual', ctypes.c_ulonglong),
+                ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+            ]
+        
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+            raise ctypes.WinError()
+        total, available = status.ullTotalPhys, status.ullAvailPhys
+    elif config.IS_LINUX:
+        meminfo = {}
+        with open('/proc/meminfo', encoding='ascii') as f:
+            for line in f.read().splitlines():
+                key, _, value = line.partition(':')
+                meminfo[key] = int(value.split()[0]) * 1024
+        total = meminfo['MemTotal']
+        available = meminfo.get('MemAvailable', meminfo.get('MemFree', 0))
+    else:
+        import psutil
+        memory = psutil.virtual_memory()
+        return memory.total, memory.available, memory.percent
+    
+    percent = round((total - available) / total * 100, 1) if total else 0.0
+    return total, available, percent
+
 def get_system_info():
     """Получает информацию о системе"""
     import platform
-    import psutil
     import locale
     
     logger = logging.getLogger(__name__)
     
-    logger.info("\n💻 Системная информация:")
-    
     # Основная информация о системе
     system = platform.system()
     release = platform.release()
@@ -734,33 +1233,41 @@ def get_system_info():
     python_build = platform.python_build()
     
     # Информация о памяти
-    memory = psutil.virtual_memory()
+    memory_total, memory_available, memory_percent = _memory_info()
     
-    # Информация о CPU
-    cpu_count = psutil.cpu_count()
-    cpu_freq = psutil.cpu_freq()
+    # Информация о CPU (psutil нужен только для частоты)
+    cpu_count = os.cpu_count()
+    try:
+        import psutil
+        cpu_freq = psutil.cpu_freq()
+    except Exception:
+        cpu_freq = None
     
     # Информация о локали
     system_locale = locale.getpreferredencoding()
     
-    # Вывод информации
-    logger.info(f"🖥️ ОС: {system} {release}")
-    logger.info(f"📝 Версия ОС: {version}")
-    logger.info(f"🔧 Архитектура: {machine}")
-    logger.info(f"⚙️ Процессор: {processor}")
-    logger.info(f"🧮 Количество ядер CPU: {cpu_count}")
+    # Собираем вывод в одну запись лога
+    lines = [
+        "\n💻 Системная информация:",
+        f"🖥️ ОС: {system} {release}",
+        f"📝 Версия ОС: {version}",
+        f"🔧 Архитектура: {machine}",
+        f"⚙️ Процессор: {processor}",
+        f"🧮 Количество ядер CPU: {cpu_count}",
+    ]
     if cpu_freq:
-        logger.info(f"⚡ Частота CPU: {cpu_freq.current:.2f} MHz")
-    
-    logger.info(f"🐍 Python реализация: {python_implementation}")
-    logger.info(f"🔨 Python сборка: {python_build[0]} {python_build[1]}")
+        lines.append(f"⚡ Частота CPU: {cpu_freq.current:.2f} MHz")
     
-    logger.info(f"💾 Оперативная память:")
-    logger.info(f"  └─ Всего: {memory.total / (1024**3):.2f} GB")
-    logger.info(f"  └─ Доступно: {memory.available / (1024**3):.2f} GB")
-    logger.info(f"  └─ Использовано: {memory.percent}%")
-    
-    logger.info(f"🌐 Системная кодировка: {system_locale}")
+    lines += [
+        f"🐍 Python реализация: {python_implementation}",
+        f"🔨 Python сборка: {python_build[0]} {python_build[1]}",
+        "💾 Оперативная память:",
+        f"  └─ Всего: {memory_total / (1024**3):.2f} GB",
+        f"  └─ Доступно: {memory_available / (1024**3):.2f} GB",
+        f"  └─ Использовано: {memory_percent}%",
+        f"🌐 Системная кодировка: {system_locale}",
+    ]
+    logger.info("\n".join(lines))
     
     # Получаем информацию о GPU
     get_gpu_info()
@@ -768,46 +1275,141 @@ def get_system_info():
 def get_gpu_info():
     """Получает информацию о GPU"""
     logger = logging.getLogger(__name__)
-    logger.info("\n🎮 Информация о GPU:")
+    lines = ["\n🎮 Информация о GPU:"]
     
     try:
-        import torch
-        if torch.cuda.is_available():
-            logger.info("🟢 CUDA доступна")
-            logger.info(f"  └─ CUDA версия: {torch.version.cuda}")
-            logger.info(f"  └─ cuDNN версия: {torch.backends.cudnn.version() if torch.backends.cudnn.is_available() else 'недоступна'}")
-            for i in range(torch.cuda.device_count()):
-                gpu_props = torch.cuda.get_device_properties(i)
-                logger.info(f"\n  GPU {i}: {gpu_props.name}")
-                logger.info(f"  └─ Общая память: {gpu_props.total_memory / (1024**2):.2f} MB")
-                logger.info(f"  └─ Количество SM: {gpu_props.multi_processor_count}")
-                logger.info(f"  └─ Compute Capability: {gpu_props.major}.{gpu_props.minor}")
+        snapshot = gpu_snapshot()
+        if not snapshot.torch_installed:
+            lines.append("🔴 torch не установлен, CUDA недоступна")
+        elif snapshot.available:
+            lines += [
+                "🟢 CUDA доступна",
+                f"  └─ CUDA версия: {snapshot.cuda_version}",
+                f"  └─ cuDNN версия: {snapshot.cudnn_version}",
+            ]
+            for i, device in enumerate(snapshot.devices):
+                lines += [
+                    f"\n  GPU {i}: {device.name}",
+                    f"  └─ Общая память: {device.total_memory / (1024**2):.2f} MB",
+                    f"  └─ Количество SM: {device.multi_processor_count}",
+                    f"  └─ Compute Capability: {device.major}.{device.minor}",
+                ]
         else:
-            logger.info("🔴 CUDA недоступна")
+            lines.append("🔴 CUDA недоступна")
             
         # Проверяем поддержку MPS (для MacOS с Apple Silicon)
-        if hasattr(torch.backends, "mps") and torch.backends.mps.is_available():
-            logger.info("🟢 MPS (Metal Performance Shaders) доступен")
+        if snapshot.mps_available:
+            lines.append("🟢 MPS (Metal Performance Shaders) доступен")
         
     except Exception as e:
         logger.warning(f"❌ Ошибка при получении информации о CUDA: {str(e)}")
     
-    # Получаем дополнительную информацию о GPU через WMI в Windows
+    # Получаем дополнительную информацию о GPU в Windows: сначала через DXGI,
+    # WMI используется только если DXGI недоступен (он инициализируется секундами)
+    if config.IS_WINDOWS:
+        lines += _get_windows_gpu_lines()
+    
+    logger.info("\n".join(lines))
+
+def _get_windows_gpu_lines() -> list:
+    """Возвращает строки с системной информацией о GPU в Windows (DXGI, затем WMI)"""
+    logger = logging.getLogger(__name__)
+    lines = []
+    try:
+        for gpu in enumerate_dxgi_gpus():
+            lines += [
+                "\n📊 Системная информация о GPU:",
+                f"  └─ Название: {gpu['name']}",
+                f"  └─ Vendor ID: 0x{gpu['vendor_id']:04X}",
+                f"  └─ Видеопамять: {gpu['dedicated_memory'] / (1024**3):.2f} GB",
+            ]
+        return lines
+    except Exception as e:
+        logger.debug(f"❌ DXGI недоступен, используется WMI: {str(e)}")
+
     try:
         import wmi
         w = wmi.WMI()
         for gpu in w.Win32_VideoController():
-            logger.info(f"\n📊 Системная информация о GPU:")
-            logger.info(f"  └─ Название: {gpu.Name}")
-            logger.info(f"  └─ Драйвер: {gpu.DriverVersion}")
+            lines += [
+                "\n📊 Системная информация о GPU:",
+                f"  └─ Название: {gpu.Name}",
+                f"  └─ Драйвер: {gpu.DriverVersion}",
+            ]
             if gpu.AdapterRAM:
                 gpu_ram = int(gpu.AdapterRAM) / (1024**3)  # Конвертируем в GB
-                logger.info(f"  └─ Видеопамять: {gpu_ram:.2f} GB")
-            logger.info(f"  └─ Разрешение: {gpu.CurrentHorizontalResolution}x{gpu.CurrentVerticalResolution}")
-            logger.info(f"  └─ Частота обновления: {gpu.CurrentRefreshRate}Hz")
+                lines.append(f"  └─ Видеопамять: {gpu_ram:.2f} GB")
             
     except Exception as e:
         logger.debug(f"❌ Ошибка при получении системной информации о GPU: {str(e)}")
+    return lines
+
+def _find_existing_files(paths) -> set:
+    """
+    Возвращает множество существующих путей из paths.
+    
+    Пути группируются по родительской директории, и каждая директория
+    читается одним os.scandir вместо отдельного stat для каждого файла.
+    """
+    by_dir = {}
+    for path in paths:
+        path = str(path)
+        names = by_dir.setdefault(os.path.dirname(path), {})
+        names[os.path.normcase(os.path.basename(path))] = path
+    
+    existing = set()
+    for directory, names in by_dir.items():
+        try:
+            with os.scandir(directory or '.') as entries:
+                for entry in entries:
+                    path = names.get(os.path.normcase(entry.name))
+                    if path is not None:
+                        existing.add(path)
+        except OSError:
+            continue
+    return existing
+
+def _env_fingerprint(tool_paths) -> list:
+    """
+    Отпечаток окружения для кэша проверок: интерпретатор, requirements.txt,
+    site-packages и директории внешних инструментов (их mtime меняется при
+    установке или удалении файлов).
+    """
+    def mtime(path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+    
+    requirements_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'requirements.txt')
+    tool_dirs = sorted({os.path.dirname(str(path)) for path in tool_paths})
+    return [
+        sys.executable,
+        mtime(requirements_path),
+        mtime(sysconfig.get_paths()['purelib']),
+        *(mtime(directory) for directory in tool_dirs),
+    ]
+
+def _load_env_cache(fingerprint: list) -> Optional[dict]:
+    """Возвращает результаты прошлой проверки окружения, если отпечаток не изменился"""
+    try:
+        with open(config.ENV_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cached if cached.get('fingerprint') == fingerprint else None
+
+def _store_env_cache(fingerprint: list, requirements_ok: bool, present_tools: set):
+    """Сохраняет результаты проверки окружения вместе с отпечатком"""
+    try:
+        with open(config.ENV_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fingerprint': fingerprint,
+                'requirements_ok': requirements_ok,
+                'present_tools': sorted(present_tools),
+            }, f)
+    except OSError as e:
+        logger.warning(f"Failed to cache environment check: {e}")
 
 def check_environment():
     """Проверяет окружение и выводит важную информацию при старте бота"""
@@ -822,11 +1424,6 @@ def check_environment():
     python_version = sys.version.split()[0]
     logger.info(f"\n📌 Python версия: {python_version}")
     
-    # Проверка requirements
-    requirements_ok = check_requirements()
-    if not requirements_ok:
-        logger.warning("⚠️ Некоторые требуемые пакеты отсутствуют!")
-    
     # Проверка необходимых зависимостей
     required_tools = {
         'FFmpeg': config.FFMPEG_EXECUTABLE,
@@ -835,13 +1432,28 @@ def check_environment():
         'wkhtmltopdf': config.WKHTMLTOPDF_PATH
     }
     
-    logger.info("\n🛠 Проверка внешних инструментов:")
+    # Проверка requirements и инструментов; если окружение не менялось с прошлого
+    # запуска, результаты берутся из кэша
+    fingerprint = _env_fingerprint(required_tools.values())
+    cached = _load_env_cache(fingerprint)
+    if cached is not None:
+        requirements_ok = cached['requirements_ok']
+        present_tools = set(cached['present_tools'])
+        logger.info("\n📦 Окружение не изменилось с прошлого запуска, используются сохраненные результаты проверки")
+    else:
+        requirements_ok = check_requirements()
+        present_tools = _find_existing_files(required_tools.values())
+        _store_env_cache(fingerprint, requirements_ok, present_tools)
+    if not requirements_ok:
+        logger.warning("⚠️ Некоторые требуемые пакеты отсутствуют!")
+    
+    lines = ["\n🛠 Проверка внешних инструментов:"]
     for tool, path in required_tools.items():
-        status = '✅' if os.path.exists(path) else '❌'
-        logger.info(f"{status} {tool}: {path}")
+        status = '✅' if str(path) in present_tools else '❌'
+        lines.append(f"{status} {tool}: {path}")
     
     # Проверка токенов
-    logger.info("\n🔑 Проверка токенов:")
+    lines.append("\n🔑 Проверка токенов:")
     tokens = {
         'TRANSCRIPT_BOT_TOKEN': bool(config.TRANSCRIPT_BOT_TOKEN),
         'OBSIMATIC_BOT_TOKEN': bool(config.OBSIMATIC_BOT_TOKEN),
@@ -850,71 +1462,105 @@ def check_environment():
     }
     for token, exists in tokens.items():
         status = '✅' if exists else '❌'
-        logger.info(f"{status} {token}")
+        lines.append(f"{status} {token}")
     
     # Вывод важных настроек
-    logger.info("\n⚙️ Настройки моделей:")
-    logger.info(f"🤖 Whisper модель (локальная): {config.WHISPER_LOCAL_MODEL}")
-    logger.info(f"🤖 Whisper модель (облачная): {config.WHISPER_CLOUD_MODEL}")
-    logger.info(f"🔄 Использовать локальный Whisper: {config.USE_LOCAL_WHISPER}")
-    logger.info(f"💭 Chat модель: {config.CHAT_MODEL}")
-    
-    logger.info("\n🎛 Настройки генерации:")
-    logger.info(f"📝 Chat температура: {config.CHAT_TEMPERATURE}")
-    logger.info(f"📊 Температура анализа: {config.ANALYSIS_TEMPERATURE}")
-    logger.info(f"📄 Генерировать PDF: {config.GENERATE_PDF}")
-    logger.info(f"✨ Markdown включен: {config.MARKDOWN_ENABLED}")
-    
-    logger.info("\n📊 Лимиты Telegram:")
-    logger.info(f"📦 Базовый лимит: {config.TELEGRAM_SIZE_LIMIT_MB}MB")
-    logger.info(f"💎 Premium лимит: {config.PREMIUM_SIZE_LIMIT_MB}MB")
-    logger.info(f"🎥 Текущий лимит видео: {config.MAX_VIDEO_SIZE_MB}MB")
-    logger.info(f"🔊 Текущий лимит аудио: {config.MAX_AUDIO_SIZE_MB}MB")
-    
-    logger.info("\n📁 Поддерживаемые форматы:")
-    logger.info(f"🎥 Видео: {', '.join(config.VIDEO_FORMATS)}")
-    logger.info(f"🔊 Аудио: {', '.join(config.AUDIO_FORMATS)}")
-    
-    logger.info("\n🔧 Режим отладки:")
-    logger.info(f"🐛 Режим отладки: {config.DEBUG_MODE}")
-    logger.info(f"📨 Отправка в группу: {config.SEND_TO_GROUP}")
-    logger.info(f"🤖 Отправка в ObsiMatic бот: {config.SEND_TO_OBSIMATIC_BOT}")
-    
-    logger.info("\n📂 Рабочие директории:")
-    logger.info(f"📌 База: {config.BASE_DIR}")
-    logger.info(f"🗃 Временные файлы: {config.TEMP_DIRECTORY}")
-    logger.info(f"📑 Обработанные файлы: {config.PROCESSED_DIRECTORY}")
-    logger.info(f"📝 Логи: {config.LOG_DIRECTORY}")
+    lines += [
+        "\n⚙️ Настройки моделей:",
+        f"🤖 Whisper модель (локальная): {config.WHISPER_LOCAL_MODEL}",
+        f"🤖 Whisper модель (облачная): {config.WHISPER_CLOUD_MODEL}",
+        f"🔄 Использовать локальный Whisper: {config.USE_LOCAL_WHISPER}",
+        f"💭 Chat модель: {config.CHAT_MODEL}",
+        
+        "\n🎛 Настройки генерации:",
+        f"📝 Chat температура: {config.CHAT_TEMPERATURE}",
+        f"📊 Температура анализа: {config.ANALYSIS_TEMPERATURE}",
+        f"📄 Генерировать PDF: {config.GENERATE_PDF}",
+        f"✨ Markdown включен: {config.MARKDOWN_ENABLED}",
+        
+        "\n📊 Лимиты Telegram:",
+        f"📦 Базовый лимит: {config.TELEGRAM_SIZE_LIMIT_MB}MB",
+        f"💎 Premium лимит: {config.PREMIUM_SIZE_LIMIT_MB}MB",
+        f"🎥 Текущий лимит видео: {config.MAX_VIDEO_SIZE_MB}MB",
+        f"🔊 Текущий лимит аудио: {config.MAX_AUDIO_SIZE_MB}MB",
+        
+        "\n📁 Поддерживаемые форматы:",
+        f"🎥 Видео: {', '.join(config.VIDEO_FORMATS)}",
+        f"🔊 Аудио: {', '.join(config.AUDIO_FORMATS)}",
+        
+        "\n🔧 Режим отладки:",
+        f"🐛 Режим отладки: {config.DEBUG_MODE}",
+        f"📨 Отправка в группу: {config.SEND_TO_GROUP}",
+        f"🤖 Отправка в ObsiMatic бот: {config.SEND_TO_OBSIMATIC_BOT}",
+        
+        "\n📂 Рабочие директории:",
+        f"📌 База: {config.BASE_DIR}",
+        f"🗃 Временные файлы: {config.TEMP_DIRECTORY}",
+        f"📑 Обработанные файлы: {config.PROCESSED_DIRECTORY}",
+        f"📝 Логи: {config.LOG_DIRECTORY}",
+    ]
+    logger.info("\n".join(lines))
+
+def _log_environment_check_error(future):
+    """Логирует ошибку фоновой проверки окружения"""
+    if not future.cancelled() and future.exception():
+        logger.error(f"Environment check failed: {future.exception()}")
 
 async def main():
     """Start the bot."""
-    global application
+    global application, _loop, stop_signal
     
     try:
-        # Create required directories
-        os.makedirs(config.TEMP_DIRECTORY, exist_ok=True)
-        os.makedirs(config.PROCESSED_DIRECTORY, exist_ok=True)
-        
+        # Рабочие директории создаются один раз при импорте config
         logger.info("Initializing bot application...")
-        application = Application.builder().token(config.TRANSCRIPT_BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(config.TRANSCRIPT_BOT_TOKEN)
+            # Обновления разных чатов обрабатываются параллельно; порядок внутри чата сохраняет per_chat
+            .concurrent_updates(32)
+            .read_timeout(30)
+            .write_timeout(30)
+            .connect_timeout(10)
+            # Пул соединений HTTPX не должен ждать бесконечно при всплеске нагрузки
+            .pool_timeout(10)
+            .rate_limiter(make_rate_limiter())
+            .build()
+        )
+        # Заметки и документы с токеном приложения отправляются через его бота и общий лимит
+        telegram_sender.use_application_bot(application.bot)
+
+        # Тяжелые объекты (модель Whisper) загружаются один раз и переиспользуются всеми обработчиками
+        application.bot_data["media"] = AudioProcessor(temp_dir=config.TEMP_DIRECTORY)
+        application.bot_data["tx"] = await asyncio.to_thread(Transcriber)
+        logger.info("Initialized audio processor and transcriber")
 
         # Add command handlers
         application.add_handler(CommandHandler("start", start))
         application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, process_youtube_link))
-        application.add_handler(MessageHandler(filters.VIDEO, process_video))
-        application.add_handler(MessageHandler(filters.VOICE | filters.AUDIO, process_audio_message))
+        # Тяжелые обработчики выполняются в очередях своих чатов и не блокируют получение обновлений
+        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, per_chat(process_youtube_link), block=False))
+        application.add_handler(MessageHandler(filters.VIDEO, per_chat(process_video), block=False))
+        application.add_handler(MessageHandler(filters.VOICE | filters.AUDIO, per_chat(process_audio_message), block=False))
         logger.info("Added command handlers")
 
         # Initialize size limits
         application.job_queue.run_once(update_size_limits, 0)
         logger.info("Initialized size limits")
+
+        # Периодически удаляем временные файлы, оставшиеся от прерванных заданий
+        application.job_queue.run_repeating(
+            cleanup_stale_temp_files, interval=config.TEMP_CLEANUP_INTERVAL, first=config.TEMP_CLEANUP_INTERVAL
+        )
         
         # Start the bot
         logger.info("Starting bot...")
         await application.initialize()
         await application.start()
         
+        # Диагностика окружения выполняется в фоне и не задерживает начало опроса
+        env_check = asyncio.get_running_loop().run_in_executor(None, check_environment)
+        env_check.add_done_callback(_log_environment_check_error)
+        
         # Start polling
         logger.info("Starting polling...")
         await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
@@ -922,63 +1568,54 @@ async def main():
         # Keep the application running
         logger.info("Bot is running. Press Ctrl+C to stop")
         
-        # Create a future that never completes unless cancelled
+        # Ждем, пока обработчик сигнала не выставит событие остановки
+        _loop = asyncio.get_running_loop()
         stop_signal = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, signal_handler)
         await stop_signal.wait()
         
-    except Exception as e:
-        logger.error(f"Error in main: {str(e)}", exc_info=True)
-        raise
+    # Исключение не логируется здесь: трассировку один раз записывает обработчик в __main__
     finally:
         logger.info("Shutting down...")
         try:
             if application:
-                await application.stop()
+                if application.updater and application.updater.running:
+                    await application.updater.stop()
+                if application.running:
+                    await application.stop()
                 await application.shutdown()
         except Exception as e:
             logger.error(f"Error during application shutdown: {str(e)}")
+        await close_http_session()
+        # Временные файлы удаляются в потоке: цикл событий еще работает, а каталог может быть большим
+        try:
+            await asyncio.to_thread(_purge_directory, config.TEMP_DIRECTORY)
+        except Exception as e:
+            logger.error(f"Error cleaning temp directory: {e}")
 
 def signal_handler(signum, frame):
     """Handle shutdown signals"""
     logger.info(f"Received signal {signal.Signals(signum).name}")
-    if application and application.is_running:
+    if _loop is not None and stop_signal is not None and not _loop.is_closed():
         logger.info("Stopping application...")
-        # Create an event loop if one doesn't exist
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        async def stop_app():
-            await application.stop()
-            await application.shutdown()
-        
-        try:
-            loop.run_until_complete(stop_app())
-        except Exception as e:
-            logger.error(f"Error during shutdown: {str(e)}")
-        finally:
-            loop.close()
-    sys.exit(0)
+        # Остановку выполняет finally в main() внутри уже работающего цикла
+        _loop.call_soon_threadsafe(stop_signal.set)
+    else:
+        sys.exit(0)
 
 if __name__ == '__main__':
     try:
-        # Настройка логирования
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('bot.log', encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
-        
-        logger = logging.getLogger(__name__)
+        # Логирование настроено при импорте модуля
         logger.info("Starting TranscriptAI bot...")
         
-        # Проверка окружения и вывод информации
-        check_environment()
+        # uvloop ускоряет цикл событий на Linux/macOS; в Windows остается стандартный цикл
+        try:
+            import uvloop
+            uvloop.install()
+            logger.info("Using uvloop event loop")
+        except ImportError:
+            pass
         
         logger.info("Initializing bot application...")
         asyncio.run(main())
@@ -992,15 +1629,10 @@ if __name__ == '__main__':
         # Ensure we cleanup any remaining resources
         logger.info("Cleaning up...")
         try:
-            if os.path.exists(config.TEMP_DIRECTORY):
-                for file in os.listdir(config.TEMP_DIRECTORY):
-                    file_path = os.path.join(config.TEMP_DIRECTORY, file)
-                    try:
-                        if os.path.isfile(file_path):
-                            os.unlink(file_path)
-                            logger.debug(f"Deleted temporary file: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting {file_path}: {str(e)}")
+            # Повторная очистка на случай, если main() завершился до своего finally (пустой каталог - один проход scandir)
+            _purge_directory(config.TEMP_DIRECTORY)
         except Exception as e:
             logger.error(f"Error during final cleanup: {str(e)}")
         logger.info("Cleanup complete. Exiting.")
+        # Дописываем оставшиеся в очереди записи лога
+        log_listener.stop()
@@ -0,0 +1,226 @@
+# Промпты OpenAI и шаблоны заметок: вынесены из config, чтобы модули,
+# которым нужны только настройки, не загружали эти тексты при импорте
+
+# Настройки анализа контента
+CONTENT_ANALYSIS_PROMPT = """Analyze the following transcript and determine if it's a Zoom meeting/phone call or a lesson/course. Respond with either 'meeting' or 'course'."""
+
+# System Prompts
+MEETING_PROMPT = """Analyze the meeting transcript and create a structured summary with the following:
+                 1. Title (inferred from content)
+                 2. List of participants
+                 3. Main topics discussed
+                 4. Key decisions and action items
+                 5. Summary of the meeting
+                 Format the output in Markdown. Language: russian."""
+
+COURSE_CONTENT_PROMPT = '''Проанализируй транскрипцию и создай подробное содержание в следующем формате:
+1. Раздели контент на логические разделы с временными метками
+2. Для каждого раздела укажи:
+   - Номер и название раздела
+   - Временной интервал в формате MM:SS-MM:SS
+   - Краткое описание содержания (2-3 предложения)
+3. Используй формат времени: 0:00-1:30, 1:30-2:45 и т.д.
+4. Сделай описания информативными и полезными
+'''
+
+COURSE_PROMPT_HEADER = """# {title}
+
+## Метаданные
+- **Автор:** {channel}
+- **Длительность:** {duration}
+- **Дата обработки:** {process_date}
+- **Ссылка:** {video_url}
+
+**Описание:**
+{original_description}
+
+---
+"""
+
+COURSE_CONTENT_FORMAT = '''### {section_number}. {section_title}
+**{start_time}-{end_time}**
+{description}
+'''
+
+COURSE_PROMPT = """Ты - эксперт по созданию структурированных конспектов. 
+Твоя задача - создать подробный, хорошо организованный конспект на основе транскрипции.
+
+Раздел "Конспект" - это ОСНОВНОЙ раздел. Вот как его нужно оформлять:
+
+1. Структура и форматирование:
+   - Используй подзаголовки третьего уровня (###) для основных тем
+   - Каждая тема должна быть на новой строке
+   - Используй маркированные списки для подтем (-)
+   - Используй вложенные списки для деталей (  *)
+   - Выделяй ключевые термины жирным (**термин**)
+
+2. Содержание каждой темы:
+   ### Название темы
+   - Основная мысль или концепция
+     * Подробное объяснение
+     * Определения важных терминов
+     * Примеры и иллюстрации
+   - Связи с другими темами
+     * Как эта тема связана с предыдущей
+     * Как она связана с последующей
+
+3. Логическая структура:
+   - Начинай с общего обзора темы
+   - Переходи к конкретным концепциям
+   - Завершай практическим применением
+   - Добавляй связки между темами
+
+4. Обязательные элементы:
+   - Вступление (общий обзор)
+   - Основные концепции и их объяснения
+   - Примеры и применение
+   - Связи между темами
+   - Краткие выводы по каждой теме
+
+5. Оформление текста:
+   - Используй короткие, четкие предложения
+   - Разделяй длинные абзацы на пункты
+   - Добавляй пробелы между разделами
+   - Сохраняй единый стиль форматирования
+
+Общие правила для всех разделов:
+1. Строго следуй структуре разделов
+2. Используй точное форматирование markdown
+3. Сохраняй отступы и структуру списков
+4. Не добавляй лишних переносов строк
+5. Делай каждый раздел информативным
+6. Используй маркированные списки и нумерацию как в шаблоне
+7. Выделяй важные термины жирным (**термин**)
+
+На основе транскрипции создай подробный конспект. 
+Строго следуй этой структуре и форматированию:
+
+## Содержание
+Проанализируй транскрипцию и создай подробное содержание в следующем формате:
+1. Раздели контент на логические разделы с временными метками
+2. Для каждого раздела укажи:
+   - Номер и название раздела
+   - Временной интервал в формате MM:SS-MM:SS
+   - Краткое описание содержания (2-3 предложения)
+3. Используй формат времени: 0:00-1:30, 1:30-2:45 и т.д.
+4. Сделай описания информативными и полезными
+
+## Конспект
+Создай подробный конспект основного содержания. Обязательно включи:
+1. Основные темы и подтемы
+2. Ключевые моменты и их объяснения
+3. Важные детали и нюансы
+4. Логические связи между частями
+
+Используй подзаголовки третьего уровня (###) для структурирования.
+
+## Основные идеи
+Выдели 3-5 ключевых идей. Для каждой:
+
+1. **Идея**: [четкая формулировка]
+   - **Значимость**: [объяснение важности]
+   - **Контекст**: [связь с общей темой]
+
+## Ключевые концепции
+Список основных терминов и концепций:
+
+1. **[Термин]**
+   - **Определение**: [четкое определение]
+   - **Важность**: [почему это важно]
+   - **Применение**: [как используется]
+
+## Практические примеры
+Конкретные примеры из материала:
+
+1. **Пример**: [название/краткое описание]
+   - **Ситуация**: [описание контекста]
+   - **Применение**: [как иллюстрирует концепцию]
+   - **Выводы**: [что можно извлечь]
+
+## Заключение
+Структурированное заключение:
+
+1. **Итоги**: [основные результаты]
+2. **Выводы**: [главные заключения]
+3. **Рекомендации**: [практические советы]
+4. **Следующие шаги**: [что делать дальше]
+
+## Полезные ссылки
+Структурированный список ресурсов:
+
+1. **Упомянутые источники**:
+   - [список источников из материала]
+
+2. **Рекомендуемые материалы**:
+   - [дополнительные ресурсы]
+
+3. **Связанные темы**:
+   - [темы для дальнейшего изучения]
+
+Транскрипция:
+{transcript}"""
+
+NOTES_MERGE_PROMPT = """Ниже приведены конспекты последовательных частей одной транскрипции.
+Объедини их в единый конспект по тем же правилам оформления: сохрани все содержательные детали,
+убери повторы на стыках частей и не упоминай, что исходный текст был разбит на части.
+
+"""
+
+# Templates for Obsidian notes
+MEETING_TEMPLATE = """# {title}
+
+## Metadata
+- Date: {date}
+- Time: {time}
+- Type: {meeting_type}
+
+## File Information
+- Filename: {filename}
+- Duration: {duration}
+- Audio Channels: {channels}
+{additional_info}
+
+## Participants
+{participants}
+
+## Summary
+{summary}
+
+## Action Items
+{action_items}
+
+## Debug Information
+### Detailed Transcript
+{transcript}
+"""
+
+COURSE_TEMPLATE = """# {title}
+
+## Metadata
+- Type: {content_type}
+- Date: {date}
+
+## Course Information
+- Filename: {filename}
+- Duration: {duration}
+- Audio Channels: {channels}
+{additional_info}
+
+## Video Information
+- Video URL: {video_url}
+- Original Description:
+{original_description}
+
+## Summary
+{summary}
+
+## Table of Contents
+{contents}
+
+## Sections
+{sections}
+
+## Debug Information
+### Detailed Transcript
+{transcript}
+"""
@@ -1,400 +1,570 @@
 import os
-import math
+import asyncio
+import json
+import functools
+import itertools
+import time
+import shutil
 import subprocess
-from moviepy.editor import VideoFileClip
-from pydub import AudioSegment
-import yt_dlp
 from datetime import datetime
-from config import FFMPEG_PATH, FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE
+from config import FFMPEG_PATH, FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE, FFMPEG_THREADS, TEMP_DIRECTORY
 import logging
 
-class AudioProcessor:
-    def __init__(self, temp_dir):
-        self.temp_dir = temp_dir
-        if not os.path.exists(temp_dir):
-            os.makedirs(temp_dir)
-        
-        # Настройка путей для FFmpeg
-        os.environ["PATH"] = FFMPEG_PATH + os.pathsep + os.environ.get("PATH", "")
+# Настройка путей для FFmpeg (yt-dlp ищет его в PATH): один раз при импорте модуля
+if FFMPEG_PATH not in os.environ.get("PATH", "").split(os.pathsep):
+    os.environ["PATH"] = FFMPEG_PATH + os.pathsep + os.environ.get("PATH", "")
+
+# Размер блока чтения stdout ffmpeg: PCM длинной записи занимает сотни мегабайт,
+# и блоки по 64 KiB (значение asyncio по умолчанию) дают тысячи лишних чтений
+PIPE_BUFFER_SIZE = 1 << 20
+
+# Байт в мегабайте: размеры файлов сравниваются в целых байтах, а не в дробных МБ
+_MB = 1 << 20
+
+try:
+    # PyAV (зависимость faster-whisper) читает заголовки контейнера через libavformat в процессе
+    import av
+except ImportError:
+    av = None
+
+def _probe_with_av(path: str) -> dict:
+    """Читает длительность и параметры потоков через PyAV в формате, совместимом с JSON ffprobe"""
+    with av.open(path) as container:
+        streams = []
+        for stream in container.streams:
+            info = {'codec_type': stream.type, 'codec_name': stream.codec_context.name}
+            if stream.type == 'audio':
+                info['sample_rate'] = str(stream.codec_context.sample_rate)
+                info['channels'] = getattr(stream.codec_context, 'channels', None)
+            if stream.bit_rate:
+                info['bit_rate'] = str(stream.bit_rate)
+            streams.append(info)
+        format_info = {'format_name': container.format.name}
+        if container.duration is not None:
+            format_info['duration'] = str(container.duration / av.time_base)
+        if container.bit_rate:
+            format_info['bit_rate'] = str(container.bit_rate)
+        return {'format': format_info, 'streams': streams}
+
+@functools.lru_cache(maxsize=64)
+def _probe_cached(path: str, mtime_ns: int, size: int) -> dict:
+    """
+    Читает описание файла один раз для его версии (mtime и размер входят в ключ кэша).
+    
+    PyAV не запускает дочерний процесс; ffprobe используется, если PyAV не установлен,
+    не смог открыть файл или не нашел длительность в заголовке.
+    """
+    if av is not None:
+        try:
+            info = _probe_with_av(path)
+            if 'duration' in info['format']:
+                return info
+        except Exception as e:
+            logging.debug(f"PyAV probe failed for {path}, falling back to ffprobe: {e}")
+    output = subprocess.check_output(
+        [FFPROBE_EXECUTABLE, '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', path],
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output)
+
+def probe(path: str) -> dict:
+    """Возвращает описание контейнера и потоков файла (в формате JSON ffprobe), кэшируя результат"""
+    st = os.stat(path)
+    return _probe_cached(path, st.st_mtime_ns, st.st_size)
+
+async def decode_to_array(path: str, sr: int = 16000, headers: str = None):
+    """
+    Декодирует аудио/видео файл (или поток по URL) в моно float32 массив NumPy с частотой sr.
+    
+    FFmpeg пишет PCM (f32le) прямо в stdout, поэтому промежуточный WAV на диске не нужен.
+    Процесс запускается асинхронно: декодирование не занимает поток пула транскрибации
+    и идет параллельно с распознаванием других заданий.
+    headers - HTTP-заголовки для URL в формате ffmpeg ("Имя: значение\r\n...").
+    """
+    import numpy as np
+    command = [
+        FFMPEG_EXECUTABLE,
+        '-threads', str(FFMPEG_THREADS),
+        '-v', 'quiet',
+        *(['-headers', headers] if headers else []),
+        '-i', path,
+        '-vn',
+        '-f', 'f32le',
+        '-ac', '1',
+        '-ar', str(sr),
+        'pipe:1'
+    ]
+    process = await asyncio.create_subprocess_exec(
+        *command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        limit=PIPE_BUFFER_SIZE
+    )
+    raw, _ = await process.communicate()
+    if process.returncode != 0:
+        raise Exception(f"Ошибка декодирования аудио: FFmpeg завершился с кодом {process.returncode}")
+    return np.frombuffer(raw, dtype=np.float32)
+
+# Предельные параметры MP3, который копируется без перекодирования: моно, частота и битрейт
+# не выше, чем нужно для распознавания речи (Whisper все равно работает с 16 kHz моно)
+COPY_MP3_MAX_SAMPLE_RATE = 24000
+COPY_MP3_MAX_BITRATE = 64000
+
+def _is_compact_mp3(info: dict) -> bool:
+    """
+    Проверяет, что файл содержит единственный аудиопоток MP3 моно с частотой и битрейтом
+    не выше COPY_MP3_MAX_SAMPLE_RATE/COPY_MP3_MAX_BITRATE. Если битрейт неизвестен, файл перекодируется.
+    """
+    audio_streams = [stream for stream in info.get('streams', []) if stream.get('codec_type') == 'audio']
+    if len(audio_streams) != 1:
+        return False
+    stream = audio_streams[0]
+    if stream.get('codec_name') != 'mp3' or stream.get('channels') != 1:
+        return False
+    sample_rate = int(stream.get('sample_rate') or 0)
+    bit_rate = int(stream.get('bit_rate') or info.get('format', {}).get('bit_rate') or 0)
+    return 0 < sample_rate <= COPY_MP3_MAX_SAMPLE_RATE and 0 < bit_rate <= COPY_MP3_MAX_BITRATE
+
+def _stream_copy_format(info: dict):
+    """
+    Возвращает расширение контейнера, если единственный аудиопоток можно передать
+    в облачный API без перекодирования (Opus моно), иначе None. Компактный MP3 копируется
+    целиком в process_audio_message (см. _is_compact_mp3).
+    """
+    audio_streams = [stream for stream in info.get('streams', []) if stream.get('codec_type') == 'audio']
+    if len(audio_streams) != 1 or audio_streams[0].get('channels') != 1:
+        return None
+    stream = audio_streams[0]
+    if stream.get('codec_name') == 'opus':
+        return '.ogg'
+    return None
 
-    def calculate_target_bitrate(self, duration: float, target_size_mb: float, channels: int) -> int:
-        """
-        Рассчитывает оптимальный битрейт для достижения целевого размера файла.
+def _mp3_cmd(input_path: str, output_path: str, *, bitrate: int, channels: int = 1,
+             sample_rate: int = 16000, abr: bool = False) -> tuple:
+    """
+    Собирает argv ffmpeg для кодирования в mp3 (по умолчанию моно 16 kHz, как нужно Whisper).
+    Единое место для общих флагов и параметров кодирования всех вызовов ffmpeg.
+    """
+    return (
+        FFMPEG_EXECUTABLE,
+        '-threads', str(FFMPEG_THREADS),
+        '-hide_banner', '-loglevel', 'error', '-nostats',
+        '-i', input_path,
+        '-vn',
+        '-acodec', 'libmp3lame',
+        # режим среднего битрейта: размер предсказуем по длительности
+        *(('-abr', '1') if abr else ()),
+        '-ac', str(channels),
+        '-ar', str(sample_rate),
+        '-b:a', f'{bitrate}k',
+        '-y',
+        output_path
+    )
+
+# Счетчик временных файлов: уникален внутри процесса, время запуска и PID различают перезапуски
+_temp_seq = itertools.count()
+_temp_prefix = f"{int(time.time())}-{os.getpid()}"
+
+def temp_name(suffix: str) -> str:
+    """Возвращает уникальное сортируемое имя временного файла (без обращения к os.urandom)"""
+    return f"{_temp_prefix}-{next(_temp_seq)}-{suffix}"
+
+@functools.cache
+def _ensure_temp_dir(temp_dir: str) -> str:
+    """Создает директорию временных файлов один раз на каждый путь"""
+    os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+@functools.cache
+def _check_ffmpeg():
+    """Пути к FFmpeg фиксированы в config: проверяем их один раз за процесс"""
+    for tool in (FFMPEG_EXECUTABLE, FFPROBE_EXECUTABLE):
+        if not os.path.exists(tool):
+            raise Exception(f"{os.path.basename(tool)} not found at {tool}")
+
+def calculate_target_bitrate(duration: float, target_size_mb: float, channels: int) -> int:
+    """
+    Рассчитывает оптимальный битрейт для достижения целевого размера файла.
+    
+    Args:
+        duration: Длительность аудио в секундах
+        target_size_mb: Целевой размер файла в мегабайтах
+        channels: Количество аудио каналов
+    
+    Returns:
+        Оптимальный битрейт в kbps, округленный до ближайшего меньшего числа, кратного 8
+    """
+    # МБ * 8 * 1024 * 1024 бит / 1024 = МБ * 8192 кбит; кратность 8 дает сброс младших битов
+    return int(target_size_mb * 8192 / (duration * channels)) & ~7
+
+def optimize_audio_file(input_path: str, output_path: str, target_size_mb: float = 20.0) -> tuple[str, dict]:
+    """
+    Оптимизирует аудио файл для достижения целевого размера с сохранением максимального качества.
+    Битрейт рассчитывается по длительности, кодирование выполняется за один проход
+    (и еще один корректирующий, если размер все же превышен).
+    
+    Args:
+        input_path: Путь к входному файлу
+        output_path: Путь для сохранения оптимизированного файла
+        target_size_mb: Целевой размер файла в мегабайтах
+    
+    Returns:
+        Кортеж из пути к оптимизированному файлу и словаря с информацией о конвертации
+    """
+    # Логирование начальных параметров
+    logging.info(f"Starting audio optimization: {input_path}")
+    logging.info(f"Target size: {target_size_mb} MB")
+    
+    # Проверка входного файла
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"Input file not found: {input_path}")
+    
+    # Получаем информацию о входном файле
+    initial_bytes = os.path.getsize(input_path)
+    logging.info(f"Initial file size: {initial_bytes / _MB:.2f} MB")
+    
+    duration = get_audio_duration(input_path)
+    logging.info(f"Audio duration: {duration} seconds")
+    
+    min_bitrate = 16  # минимально допустимый битрейт
+    max_bitrate = 192  # максимальный битрейт
+    
+    # Битрейт считается по длительности сразу (с запасом 5% на заголовки и колебания ABR),
+    # поэтому источник обычно кодируется один раз вместо перебора битрейтов
+    bitrate = min(max_bitrate, max(min_bitrate, calculate_target_bitrate(duration, target_size_mb * 0.95, 1)))
+    # Стерео имеет смысл, только если на каждый канал остается не меньше минимального битрейта
+    channels = 2 if bitrate >= 2 * min_bitrate else 1
+    
+    target_bytes = target_size_mb * _MB
+    optimization_steps = []
+    
+    # Второй проход нужен, только если первый все же превысил целевой размер
+    for attempt in range(2):
+        command = _mp3_cmd(input_path, output_path, bitrate=bitrate, channels=channels, abr=True)
+        
+        logging.info(f"Attempt {attempt + 1}: Bitrate {bitrate}k, Channels {channels}")
         
-        Args:
-            duration: Длительность аудио в секундах
-            target_size_mb: Целевой размер файла в мегабайтах
-            channels: Количество аудио каналов
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            error = process.stderr.decode(errors='replace')
+            logging.error(f"FFmpeg conversion error: {error}")
+            raise Exception(f"FFmpeg conversion error: {error}")
         
-        Returns:
-            Оптимальный битрейт в kbps, округленный до ближайшего меньшего числа, кратного 8
-        """
-        # Конвертируем размер в биты
-        target_size_bits = target_size_mb * 8 * 1024 * 1024
+        # Проверяем результат
+        actual_bytes = os.path.getsize(output_path)
+        actual_size = actual_bytes / _MB  # МБ только для логов и отчета
+        logging.info(f"Converted file size: {actual_size:.2f} MB")
         
-        # Рассчитываем битрейт
-        bitrate = (target_size_bits / (duration * channels * 1024))
+        optimization_steps.append({
+            'step': attempt + 1,
+            'channels': channels,
+            'bitrate': bitrate,
+            'size_mb': actual_size
+        })
         
-        # Округляем до ближайшего меньшего числа, кратного 8
-        return math.floor(bitrate / 8) * 8
+        if actual_bytes <= target_bytes:
+            # Цель достигнута
+            logging.info(f"Successfully optimized audio to {actual_size:.2f} MB")
+            return output_path, {
+                'final_size_mb': actual_size,
+                'channels': channels,
+                'bitrate': bitrate,
+                'duration': duration,
+                'optimization_steps': optimization_steps
+            }
+        
+        if bitrate <= min_bitrate:
+            logging.warning("Cannot further reduce audio quality")
+            break
+        # Корректируем битрейт пропорционально превышению
+        bitrate = max(min_bitrate, int(bitrate * target_bytes / actual_bytes * 0.95) // 8 * 8)
+        channels = 2 if bitrate >= 2 * min_bitrate and channels == 2 else 1
+    
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    # Если не удалось оптимизировать
+    logging.error("Failed to optimize audio to target size")
+    raise Exception(f"Could not optimize audio to {target_size_mb} MB after {len(optimization_steps)} attempts")
+
+def get_audio_duration(file_path: str) -> float:
+    """Получает длительность аудио/видео файла в секундах."""
+    try:
+        return float(probe(file_path)['format']['duration'])
+    except Exception as e:
+        raise Exception(f"Ошибка при получении длительности файла: {str(e)}")
 
-    def optimize_audio_file(self, input_path: str, output_path: str, target_size_mb: float = 20.0) -> tuple[str, dict]:
-        """
-        Оптимизирует аудио файл для достижения целевого размера с сохранением максимального качества.
-        Использует поэтапное снижение качества для достижения целевого размера.
+def process_audio_file(input_path: str, output_path: str, target_size_mb: float = 24) -> str:
+    """
+    Обрабатывает аудио файл с учетом ограничения размера.
+    """
+    try:
+        # Получаем длительность
+        duration = get_audio_duration(input_path)
         
-        Args:
-            input_path: Путь к входному файлу
-            output_path: Путь для сохранения оптимизированного файла
-            target_size_mb: Целевой размер файла в мегабайтах
+        # Рассчитываем оптимальный битрейт
+        bitrate = calculate_target_bitrate(duration, target_size_mb, 1)
         
-        Returns:
-            Кортеж из пути к оптимизированному файлу и словаря с информацией о конвертации
-        """
-        # Логирование начальных параметров
-        logging.info(f"Starting audio optimization: {input_path}")
-        logging.info(f"Target size: {target_size_mb} MB")
+        # Аргументы форматируются логгером только если запись действительно выводится
+        logging.debug("Обработка аудио: длительность=%.1fс, битрейт=%skbps", duration, bitrate)
         
-        # Проверка входного файла
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"Input file not found: {input_path}")
+        # Конвертируем с рассчитанным битрейтом
+        command = _mp3_cmd(input_path, output_path, bitrate=bitrate)
         
-        # Получаем информацию о входном файле
-        initial_size = os.path.getsize(input_path) / (1024 * 1024)
-        logging.info(f"Initial file size: {initial_size:.2f} MB")
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
         
-        duration = self.get_audio_duration(input_path)
-        logging.info(f"Audio duration: {duration} seconds")
+        if process.returncode != 0:
+            raise Exception(f"Ошибка FFmpeg: {process.stderr.decode(errors='replace')}")
         
-        temp_path = output_path + ".temp.mp3"
+        return output_path
         
-        # Начальные параметры
-        channels = 2  # начинаем со стерео
-        min_bitrate = 16  # минимально допустимый битрейт
-        max_bitrate = 192  # максимальный битрейт
-        current_bitrate = max_bitrate
+    except Exception as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise Exception(f"Ошибка обработки аудио: {str(e)}")
+
+def download_youtube_video(url, *, temp_dir: str = TEMP_DIRECTORY):
+    """Download YouTube video and extract audio"""
+    _ensure_temp_dir(temp_dir)
+    name = temp_name("yt")
+    output_base = os.path.join(temp_dir, name)
+    final_output = output_base + ".mp3"
+    
+    try:
+        ydl_opts = {
+            'format': 'bestaudio/best',
+            'outtmpl': output_base + '.%(ext)s',
+            'ffmpeg_location': FFMPEG_PATH,
+            'socket_timeout': 30,
+            'retries': 3,
+            'fragment_retries': 3,
+            'ignoreerrors': True,
+            # Без построчного вывода прогресса yt-dlp не форматирует строки на каждый блок
+            'quiet': True,
+            'no_warnings': True,
+            'noprogress': True,
+        }
         
-        optimization_steps = []
-        max_attempts = 10  # Максимальное число попыток
+        # Получаем информацию о видео
+        # yt_dlp импортируется только здесь: остальным методам он не нужен
+        import yt_dlp
+        from yt_dlp.postprocessor import FFmpegExtractAudioPP
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(url, download=False)
+            if not info:
+                raise Exception("Failed to extract video information")
+
+            # Битрейт выбирается по длительности из info заранее, чтобы постпроцессор
+            # yt-dlp за один проход ffmpeg получил mp3 в пределах лимита 24 MB
+            bitrate = 64
+            duration = info.get('duration') or 0
+            if duration > 0:
+                bitrate = max(16, min(bitrate, calculate_target_bitrate(duration, 23, 1)))
+            if info.get('protocol') in ('http', 'https') and info.get('url'):
+                # Прямой http-поток подается в stdin ffmpeg по мере скачивания: загрузка
+                # и кодирование идут параллельно, исходник на диск не записывается
+                _pipe_to_mp3(ydl, info, final_output, bitrate)
+            else:
+                # Whisper работает с моно 16 kHz, поэтому сразу сводим аудио к этому формату
+                ydl.params['postprocessor_args'] = {
+                    'extractaudio': ['-threads', str(FFMPEG_THREADS), '-ac', '1', '-ar', '16000']
+                }
+                ydl.add_post_processor(
+                    FFmpegExtractAudioPP(ydl, preferredcodec='mp3', preferredquality=str(bitrate)),
+                    when='post_process'
+                )
+
+                # Загружаем аудио по уже полученной информации без повторного запроса;
+                # исходный файл постпроцессор удаляет сам (HLS/DASH)
+                ydl.process_ie_result(info, download=True)
         
-        for attempt in range(max_attempts):
-            # Шаг 1: Пробуем с текущими параметрами
-            command = [
-                FFMPEG_EXECUTABLE,
-                '-i', input_path,
-                '-acodec', 'libmp3lame',
-                '-ac', str(channels),
-                '-ar', '16000',  # Частота дискретизации
-                '-b:a', f'{current_bitrate}k',
-                '-y',
-                temp_path
-            ]
-            
-            logging.info(f"Attempt {attempt + 1}: Bitrate {current_bitrate}k, Channels {channels}")
-            
-            try:
-                process = subprocess.run(command, capture_output=True, text=True)
-                
-                if process.returncode != 0:
-                    logging.error(f"FFmpeg conversion error: {process.stderr}")
-                    raise Exception(f"FFmpeg conversion error: {process.stderr}")
-                
-                # Проверяем результат
-                actual_size = os.path.getsize(temp_path) / (1024 * 1024)
-                logging.info(f"Converted file size: {actual_size:.2f} MB")
-                
-                optimization_steps.append({
-                    'step': len(optimization_steps) + 1,
-                    'channels': channels,
-                    'bitrate': current_bitrate,
-                    'size_mb': actual_size
-                })
-                
-                if actual_size <= target_size_mb:
-                    # Цель достигнута
-                    os.rename(temp_path, output_path)
-                    logging.info(f"Successfully optimized audio to {actual_size:.2f} MB")
-                    return output_path, {
-                        'final_size_mb': actual_size,
-                        'channels': channels,
-                        'bitrate': current_bitrate,
-                        'duration': duration,
-                        'optimization_steps': optimization_steps
-                    }
-                
-                # Уменьшаем битрейт или каналы
-                if current_bitrate > min_bitrate:
-                    current_bitrate -= 16  # Уменьшаем битрейт
-                elif channels > 1:
-                    channels -= 1  # Уменьшаем количество каналов
-                    current_bitrate = max_bitrate  # Сбрасываем битрейт
-                else:
-                    logging.warning("Cannot further reduce audio quality")
-                    break
-            
-            except Exception as e:
-                logging.error(f"Error in optimization attempt: {e}")
-                break
+        if not os.path.exists(final_output):
+            raise Exception("Download completed but file not found")
         
-        # Если не удалось оптимизировать
-        logging.error("Failed to optimize audio to target size")
-        raise Exception(f"Could not optimize audio to {target_size_mb} MB after {max_attempts} attempts")
-
-    def get_audio_duration(self, file_path: str) -> float:
-        """Получает длительность аудио/видео файла в секундах."""
-        command = [
-            FFPROBE_EXECUTABLE,
-            '-v', 'error',
-            '-show_entries', 'format=duration',
-            '-of', 'default=noprint_wrappers=1:nokey=1',
-            file_path
-        ]
+        # Возвращаем путь к файлу и информацию о видео
+        return final_output, {
+            'title': info.get('title', 'Unknown'),
+            'channel': info.get('uploader', 'Unknown'),
+            'duration': str(datetime.fromtimestamp(info.get('duration', 0)).strftime('%H:%M:%S')),
+            'upload_date': info.get('upload_date', 'Unknown'),
+            'video_url': url,
+            'original_description': info.get('description', 'No description available'),
+            'process_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
         
-        try:
-            result = subprocess.run(command, capture_output=True, text=True)
-            return float(result.stdout.strip())
-        except Exception as e:
-            raise Exception(f"Ошибка при получении длительности файла: {str(e)}")
+    except Exception as e:
+        # Очищаем временные файлы при ошибке (включая недокачанный исходник)
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith(f"{name}."):
+                    os.remove(entry.path)
+        raise Exception(f"YouTube download error: {str(e)}")
 
-    def process_audio_file(self, input_path: str, output_path: str, target_size_mb: float = 24) -> str:
-        """
-        Обрабатывает аудио файл с учетом ограничения размера.
-        """
-        try:
-            # Получаем длительность
-            duration = self.get_audio_duration(input_path)
-            
-            # Рассчитываем оптимальный битрейт
-            bitrate = self.calculate_target_bitrate(duration, target_size_mb, 2)
-            
-            print(f"Обработка аудио: длительность={duration:.1f}с, битрейт={bitrate}kbps")
-            
-            # Конвертируем с рассчитанным битрейтом
-            command = [
-                FFMPEG_EXECUTABLE,
-                '-i', input_path,
-                '-acodec', 'libmp3lame',    # MP3 кодек
-                '-ac', '2',                 # стерео
-                '-ar', '24000',             # 24kHz (хорошо для речи)
-                '-b:a', f'{bitrate}k',      # рассчитанный битрейт
-                '-y',                       # перезаписать если существует
-                output_path
-            ]
-            
-            process = subprocess.run(command, capture_output=True, text=True)
-            
-            if process.returncode != 0:
-                raise Exception(f"Ошибка FFmpeg: {process.stderr}")
-            
-            return output_path
-            
-        except Exception as e:
-            if os.path.exists(output_path):
-                os.remove(output_path)
-            raise Exception(f"Ошибка обработки аудио: {str(e)}")
+def _pipe_to_mp3(ydl, info: dict, output_path: str, bitrate: int):
+    """Скачивает выбранный http-формат через сетевой стек yt-dlp прямо в stdin ffmpeg"""
+    from yt_dlp.networking import Request
+    process = subprocess.Popen(
+        _mp3_cmd('pipe:0', output_path, bitrate=bitrate),
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    try:
+        with ydl.urlopen(Request(info['url'], headers=info.get('http_headers') or {})) as response:
+            try:
+                shutil.copyfileobj(response, process.stdin, PIPE_BUFFER_SIZE)
+            except BrokenPipeError:
+                # ffmpeg завершился раньше: причина будет в stderr
+                pass
+        _, stderr = process.communicate()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg conversion error: {stderr.decode(errors='replace')}")
 
-    def download_youtube_video(self, url):
-        """Download YouTube video and extract audio"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        temp_output = os.path.join(self.temp_dir, f"yt_{timestamp}_temp.m4a")
-        final_output = os.path.join(self.temp_dir, f"yt_{timestamp}.mp3")
+def extract_audio(video_path, *, temp_dir: str = TEMP_DIRECTORY):
+    """Extract audio from video file and return path to audio file"""
+    _ensure_temp_dir(temp_dir)
+    name = temp_name("audio")
+    temp_path = os.path.join(temp_dir, f"{name}_temp.mp3")
+    final_path = os.path.join(temp_dir, f"{name}.mp3")
+    
+    try:
+        # Видео без звуковой дорожки отбрасываем до запуска ffmpeg (данные probe кэшируются)
+        info = probe(video_path)
+        if not any(stream.get('codec_type') == 'audio' for stream in info.get('streams', [])):
+            raise Exception("В видео нет звуковой дорожки")
         
-        try:
-            # Сначала скачиваем в m4a (лучшее качество)
-            ydl_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': temp_output,
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'm4a',
-                }],
-                'ffmpeg_location': FFMPEG_PATH,
-                'socket_timeout': 30,
-                'retries': 3,
-                'fragment_retries': 3,
-                'ignoreerrors': True,
-                'quiet': False,
-                'no_warnings': False,
-            }
-            
-            # Получаем информацию о видео
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if not info:
-                    raise Exception("Failed to extract video information")
-
-                # Загружаем видео
-                error_code = ydl.download([url])
-                if error_code != 0:
-                    raise Exception("Failed to download video")
-                
-                if not os.path.exists(temp_output):
-                    raise Exception("Download completed but file not found")
-            
-            # Конвертируем в mp3 с оптимальными параметрами
-            command = [
-                FFMPEG_EXECUTABLE,
-                '-i', temp_output,
-                '-acodec', 'libmp3lame',    # MP3 кодек
-                '-ac', '2',                 # стерео (лучше для распознавания речи)
-                '-ar', '24000',             # 24kHz (хорошее качество для речи)
-                '-b:a', '128k',             # 128kbps битрейт (баланс качества и размера)
-                '-y',                       # перезаписать если существует
-                final_output
-            ]
-            
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
-            stdout, stderr = process.communicate()
-            
-            if process.returncode != 0:
-                raise Exception(f"FFmpeg conversion error: {stderr.decode()}")
-            
-            # Проверяем размер файла (должен быть меньше 25 MB)
-            file_size = os.path.getsize(final_output) / (1024 * 1024)  # в MB
-            if file_size > 24:  # оставляем небольшой запас
-                # Если файл слишком большой, пересжимаем с меньшим битрейтом
-                command[9] = '64k'  # уменьшаем битрейт до 64kbps
-                process = subprocess.Popen(
-                    command,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE
-                )
-                stdout, stderr = process.communicate()
-                
-                if process.returncode != 0:
-                    raise Exception(f"FFmpeg recompression error: {stderr.decode()}")
-            
-            # Удаляем временный файл
-            if os.path.exists(temp_output):
-                os.remove(temp_output)
-            
-            # Возвращаем путь к файлу и информацию о видео
-            return final_output, {
-                'title': info.get('title', 'Unknown'),
-                'channel': info.get('uploader', 'Unknown'),
-                'duration': str(datetime.fromtimestamp(info.get('duration', 0)).strftime('%H:%M:%S')),
-                'upload_date': info.get('upload_date', 'Unknown'),
-                'video_url': url,
-                'original_description': info.get('description', 'No description available'),
-                'process_date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            
-        except Exception as e:
-            # Очищаем временные файлы при ошибке
-            for file in [temp_output, final_output]:
-                if os.path.exists(file):
-                    os.remove(file)
-            raise Exception(f"YouTube download error: {str(e)}")
-
-    def extract_audio(self, video_path):
-        """Extract audio from video file and return path to audio file"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        temp_path = os.path.join(self.temp_dir, f"audio_{timestamp}_temp.mp3")
-        final_path = os.path.join(self.temp_dir, f"audio_{timestamp}.mp3")
+        # Битрейт выбирается по длительности заранее, чтобы длинное видео кодировалось
+        # один раз сразу в лимит 24 MB, а не записывалось целиком и пережималось повторно
+        bitrate = 64
+        duration = float(info.get('format', {}).get('duration') or 0)
+        if duration > 0:
+            bitrate = max(8, min(bitrate, calculate_target_bitrate(duration, 23, 1)))
         
-        try:
-            # Сначала извлекаем аудио с хорошим качеством
-            command = [
-                FFMPEG_EXECUTABLE,
-                '-i', video_path,
-                '-vn',                   # отключаем видео
-                '-acodec', 'libmp3lame', # MP3 кодек
-                '-ac', '2',              # стерео
-                '-ar', '24000',          # 24kHz
-                '-b:a', '192k',          # начальное хорошее качество
-                '-y',                    # перезаписать если существует
-                temp_path
-            ]
-            
-            process = subprocess.run(command, capture_output=True, text=True)
-            
-            if process.returncode != 0:
-                raise Exception(f"Ошибка FFmpeg: {process.stderr}")
-            
-            # Проверяем размер файла
-            file_size = os.path.getsize(temp_path) / (1024 * 1024)  # в MB
+        # Whisper работает с моно 16 kHz, поэтому сразу извлекаем аудио в этом формате
+        command = _mp3_cmd(video_path, temp_path, bitrate=bitrate)
+        
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        
+        if process.returncode != 0:
+            raise Exception(f"Ошибка FFmpeg: {process.stderr.decode(errors='replace')}")
+        
+        # Проверяем размер файла
+        file_size = os.path.getsize(temp_path)
+        
+        # Повторное сжатие нужно только если длительность в заголовке была неизвестна или неточна
+        if file_size > 24 * _MB:
+            logging.info("Размер аудио (%.1fMB) превышает лимит. Выполняется сжатие...", file_size / _MB)
+            process_audio_file(temp_path, final_path)
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return final_path
+        else:
+            return temp_path
             
-            if file_size > 24:
-                print(f"Размер аудио ({file_size:.1f}MB) превышает лимит. Выполняется сжатие...")
-                self.process_audio_file(temp_path, final_path)
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                return final_path
-            else:
-                return temp_path
-                
-        except Exception as e:
-            # Очищаем временные файлы при ошибке
-            for path in [temp_path, final_path]:
-                if os.path.exists(path):
-                    os.remove(path)
-            raise Exception(f"Ошибка извлечения аудио: {str(e)}")
+    except Exception as e:
+        # Очищаем временные файлы при ошибке
+        for path in [temp_path, final_path]:
+            if os.path.exists(path):
+                os.remove(path)
+        raise Exception(f"Ошибка извлечения аудио: {str(e)}")
 
-    def process_audio_message(self, audio_file_path: str) -> str:
-        """
-        Обрабатывает аудио сообщение: оптимизирует размер и качество.
+def process_audio_message(audio_file_path: str, *, temp_dir: str = TEMP_DIRECTORY) -> str:
+    """
+    Обрабатывает аудио сообщение: оптимизирует размер и качество.
+    
+    Args:
+        audio_file_path: Путь к входному аудио файлу
         
-        Args:
-            audio_file_path: Путь к входному аудио файлу
-            
-        Returns:
-            Путь к обработанному файлу
-        """
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = os.path.join(self.temp_dir, f"processed_{timestamp}.mp3")
+    Returns:
+        Путь к обработанному файлу
+    """
+    _ensure_temp_dir(temp_dir)
+    output_path = os.path.join(temp_dir, f"{temp_name('processed')}.mp3")
+    
+    try:
+        # Получаем размер исходного файла
+        file_size = os.path.getsize(audio_file_path)
         
-        try:
-            # Получаем размер исходного файла
-            file_size = os.path.getsize(audio_file_path) / (1024 * 1024)  # в MB
-            
-            if file_size > 20:
-                # Если файл большой, используем оптимизацию
-                output_path, conversion_info = self.optimize_audio_file(
-                    audio_file_path, 
-                    output_path,
-                    target_size_mb=20.0
-                )
-                logging.info(f"Audio optimization results: {conversion_info}")
-                return output_path
-            
-            # Для небольших файлов используем базовые параметры
-            command = [
-                FFMPEG_EXECUTABLE,
-                '-i', audio_file_path,
-                '-acodec', 'libmp3lame',
-                '-ac', '1',                 # начинаем сразу с моно для маленьких файлов
-                '-ar', '16000',
-                '-b:a', '32k',              # базовый битрейт для небольших файлов
-                '-y',
-                output_path
-            ]
-            
-            process = subprocess.run(command, capture_output=True, text=True)
-            if process.returncode != 0:
-                raise Exception(f"FFmpeg conversion error: {process.stderr}")
-            
+        if file_size > 20 * _MB:
+            # Если файл большой, используем оптимизацию
+            output_path, conversion_info = optimize_audio_file(
+                audio_file_path, 
+                output_path,
+                target_size_mb=20.0
+            )
+            logging.info(f"Audio optimization results: {conversion_info}")
             return output_path
-            
-        except Exception as e:
-            raise Exception(f"Ошибка обработки аудио сообщения: {str(e)}")
+        
+        # Компактный MP3 моно до 20 МБ уже подходит и для API, и для локальной модели: файл копируется
+        # как есть, без запуска ffmpeg и без потерь от повторного перекодирования в 32 kbps
+        info = probe(audio_file_path)
+        if _is_compact_mp3(info):
+            shutil.copyfile(audio_file_path, output_path)
+            return output_path
+        
+        # Если поток уже компактный и моно (Opus голосовых сообщений),
+        # перекодирование не нужно: поток копируется в контейнер с нужным расширением
+        copy_format = _stream_copy_format(info)
+        if copy_format:
+            output_path = os.path.splitext(output_path)[0] + copy_format
+            command = [FFMPEG_EXECUTABLE, '-threads', str(FFMPEG_THREADS), '-hide_banner', '-loglevel', 'error', '-nostats',
+                       '-i', audio_file_path, '-vn', '-c:a', 'copy', '-y', output_path]
+            process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            if process.returncode == 0:
+                return output_path
+            logging.warning(f"Stream copy failed, re-encoding: {process.stderr.decode(errors='replace')}")
+            output_path = os.path.splitext(output_path)[0] + '.mp3'
+
+        # Для небольших файлов используем базовые параметры
+        command = _mp3_cmd(audio_file_path, output_path, bitrate=32)
+        
+        process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        if process.returncode != 0:
+            raise Exception(f"FFmpeg conversion error: {process.stderr.decode(errors='replace')}")
+        
+        return output_path
+        
+    except Exception as e:
+        raise Exception(f"Ошибка обработки аудио сообщения: {str(e)}")
+
+def cleanup_temp_files(max_age_hours=24, *, temp_dir: str = TEMP_DIRECTORY):
+    """Clean up old temporary files"""
+    try:
+        # scandir отдает тип файла из самого чтения директории, а stat кэшируется в DirEntry
+        cutoff = time.time() - max_age_hours * 3600
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_ctime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                    except Exception as e:
+                        logging.warning(f"Failed to remove old file {entry.path}: {str(e)}")
+    except Exception as e:
+        logging.warning(f"Error during cleanup: {str(e)}")
+
+class AudioProcessor:
+    """
+    Обертка над функциями модуля для прежнего интерфейса: хранит только temp_dir
+    и передает его функциям, которые создают или чистят временные файлы.
+    """
+    calculate_target_bitrate = staticmethod(calculate_target_bitrate)
+    optimize_audio_file = staticmethod(optimize_audio_file)
+    get_audio_duration = staticmethod(get_audio_duration)
+    process_audio_file = staticmethod(process_audio_file)
+
+    def __init__(self, temp_dir=TEMP_DIRECTORY):
+        self.temp_dir = _ensure_temp_dir(temp_dir)
+        _check_ffmpeg()
+
+    def download_youtube_video(self, url):
+        return download_youtube_video(url, temp_dir=self.temp_dir)
+
+    def extract_audio(self, video_path):
+        return extract_audio(video_path, temp_dir=self.temp_dir)
+
+    def process_audio_message(self, audio_file_path: str) -> str:
+        return process_audio_message(audio_file_path, temp_dir=self.temp_dir)
 
     def cleanup_temp_files(self, max_age_hours=24):
-        """Clean up old temporary files"""
-        try:
-            current_time = datetime.now()
-            for file in os.listdir(self.temp_dir):
-                file_path = os.path.join(self.temp_dir, file)
-                if os.path.isfile(file_path):
-                    file_time = datetime.fromtimestamp(os.path.getctime(file_path))
-                    age = current_time - file_time
-                    if age.total_seconds() > max_age_hours * 3600:
-                        try:
-                            os.remove(file_path)
-                        except Exception as e:
-                            logging.warning(f"Failed to remove old file {file_path}: {str(e)}")
-        except Exception as e:
-            logging.warning(f"Error during cleanup: {str(e)}")
+        return cleanup_temp_files(max_age_hours, temp_dir=self.temp_dir)
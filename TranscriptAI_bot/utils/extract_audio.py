@@ -1,12 +1,94 @@
 import os
+import json
+import logging
 import math
 import argparse
-from moviepy.editor import VideoFileClip, AudioFileClip
+import functools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
+logger = logging.getLogger(__name__)
+
 # Максимальный размер аудио файла в МБ
 MAX_AUDIO_SIZE_MB = 20
 
+# Поддерживаемые расширения входных файлов
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.wmv', '.mkv', '.mov', '.flv'})
+AUDIO_EXTENSIONS = frozenset({'.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac', '.wma'})
+
+# Средний битрейт LAME VBR (kbps) для -q:a 0..9: по нему заранее видно, уложится ли VBR в лимит
+LAME_VBR_AVERAGE_KBPS = (245, 225, 190, 175, 165, 130, 115, 100, 85, 65)
+
+# Потоков на один процесс FFmpeg: при пакетной обработке ядра делятся между файлами
+FFMPEG_THREADS = 2
+
+def probe_media(input_path: str) -> dict:
+    """
+    Читает длительность и аудиопотоки файла через ffprobe (без декодирования).
+    
+    Args:
+        input_path (str): Путь к медиа файлу
+    
+    Returns:
+        dict: {'duration': длительность в секундах, 'has_audio': есть ли аудио дорожка}
+    """
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a",
+         "-show_entries", "format=duration:stream=index", "-of", "json", input_path],
+        capture_output=True
+    )
+    if result.returncode != 0:
+        raise Exception(f"Ошибка ffprobe: {result.stderr.decode(errors='replace')}")
+    info = json.loads(result.stdout)
+    return {
+        'duration': float(info.get('format', {}).get('duration') or 0),
+        'has_audio': bool(info.get('streams')),
+    }
+
+@functools.cache
+def available_encoders() -> frozenset:
+    """Возвращает имена аудио кодеров сборки FFmpeg (опрашивается один раз за процесс)."""
+    result = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True)
+    encoders = set()
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        # Строки кодеров имеют вид " A....D libmp3lame  описание"; первая буква флагов - тип
+        if len(fields) >= 2 and len(fields[0]) == 6 and fields[0][0] == 'A' and fields[1] != '=':
+            encoders.add(fields[1])
+    return frozenset(encoders)
+
+def aac_encoder() -> str:
+    """libfdk_aac, если FFmpeg собран с ним (лучше качество на бит), иначе встроенный aac."""
+    return 'libfdk_aac' if 'libfdk_aac' in available_encoders() else 'aac'
+
+def encode_audio(input_path: str, output_path: str, bitrate: Optional[str] = None,
+                 vbr_quality: Optional[int] = None, encoder: str = "libmp3lame") -> str:
+    """
+    Кодирует аудио дорожку файла кодером encoder (MP3 или AAC) одним вызовом FFmpeg (видео отбрасывается).
+    
+    Args:
+        input_path (str): Путь к входному файлу (видео или аудио)
+        output_path (str): Путь для сохранения аудио файла (.mp3 или .m4a)
+        bitrate (Optional[str]): Постоянный битрейт в формате FFmpeg, например "128k"
+        vbr_quality (Optional[int]): Качество VBR LAME (0 - лучшее, 9 - худшее);
+                                     если задано, используется вместо bitrate
+        encoder (str): Аудио кодер FFmpeg (по умолчанию libmp3lame; для AAC см. aac_encoder)
+    
+    Returns:
+        str: Путь к созданному файлу
+    """
+    rate_args = ["-q:a", str(vbr_quality)] if vbr_quality is not None else ["-b:a", bitrate]
+    result = subprocess.run(
+        ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-nostats",
+         "-threads", str(FFMPEG_THREADS), "-i", input_path, "-vn", "-acodec", encoder, *rate_args,
+         "-map_metadata", "-1", output_path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        raise Exception(f"Ошибка FFmpeg: {result.stderr.decode(errors='replace')}")
+    return output_path
+
 def calculate_bitrate(audio_duration: float, target_size_mb: float) -> int:
     """
     Рассчитывает необходимый битрейт для достижения целевого размера файла.
@@ -31,43 +113,24 @@ def calculate_bitrate(audio_duration: float, target_size_mb: float) -> int:
     # Устанавливаем минимальный битрейт 32 kbps
     return max(32, kbps)
 
-def compress_audio(input_path: str, output_path: str, target_size_mb: float) -> str:
-    """
-    Сжимает аудио файл до указанного размера.
-    
-    Args:
-        input_path (str): Путь к входному аудио файлу
-        output_path (str): Путь для сохранения сжатого файла
-        target_size_mb (float): Целевой размер файла в МБ
-    
-    Returns:
-        str: Путь к сжатому файлу
-    """
-    # Загружаем аудио
-    audio = AudioFileClip(input_path)
-    
-    # Рассчитываем необходимый битрейт
-    bitrate = calculate_bitrate(audio.duration, target_size_mb)
-    print(f"      • Длительность: {audio.duration:.1f} сек")
-    print(f"      • Целевой размер: {target_size_mb:.1f}MB")
-    print(f"      • Расчетный битрейт: {bitrate}kbps")
-    
-    # Сохраняем с новым битрейтом
-    audio.write_audiofile(output_path, bitrate=f"{bitrate}k")
-    audio.close()
-    
-    final_size = get_file_size_mb(output_path)
-    print(f"      • Фактический размер: {final_size:.1f}MB")
-    
-    return output_path
+def estimate_size_mb(audio_duration: float, bitrate: str) -> float:
+    """Оценивает размер MP3 в МБ по длительности и битрейту в формате FFmpeg ("128k")."""
+    kbps = float(bitrate.lower().rstrip('k'))
+    # kbps * 1024 / 8 байт в секунду, деленные на 1024 * 1024 байт в МБ
+    return audio_duration * kbps / 8192
 
 def get_file_size_mb(file_path: str) -> float:
     """Возвращает размер файла в МБ."""
     return os.path.getsize(file_path) / (1024 * 1024)
 
-def extract_audio(input_path: str, output_path: Optional[str] = None, bitrate: str = "128k") -> str:
+def default_output_path(input_path: str, codec: str = "mp3") -> str:
+    """Путь результата рядом с входным файлом: то же имя с расширением .mp3 (или .m4a для AAC)."""
+    return os.path.splitext(input_path)[0] + ('.m4a' if codec == 'aac' else '.mp3')
+
+def extract_audio(input_path: str, output_path: Optional[str] = None, bitrate: str = "128k",
+                  codec: str = "mp3", vbr_quality: Optional[int] = 4) -> str:
     """
-    Извлекает или конвертирует аудио в формат MP3.
+    Извлекает или конвертирует аудио в формат MP3 (или AAC в .m4a при codec="aac").
     Если входной файл - видео, извлекает из него аудио дорожку.
     Если входной файл - аудио, конвертирует его в MP3 если нужно.
     Если размер превышает MAX_AUDIO_SIZE_MB, файл автоматически сжимается.
@@ -76,7 +139,12 @@ def extract_audio(input_path: str, output_path: Optional[str] = None, bitrate: s
         input_path (str): Путь к входному файлу (видео или аудио)
         output_path (Optional[str]): Путь для сохранения MP3 файла. 
                                    Если не указан, создается рядом с входным файлом
-        bitrate (str): Начальный битрейт аудио (по умолчанию "128k")
+        bitrate (str): Начальный битрейт аудио (по умолчанию "128k"); для MP3 с VBR
+                       используется только при переходе на постоянный битрейт
+        codec (str): "mp3" (libmp3lame) или "aac" (libfdk_aac, если доступен, иначе aac)
+        vbr_quality (Optional[int]): Качество VBR LAME для MP3 (по умолчанию 4, в среднем ~165 kbps);
+                                     None - постоянный битрейт. Если VBR не укладывается в лимит,
+                                     файл кодируется с постоянным битрейтом под лимит
     
     Returns:
         str: Путь к созданному MP3 файлу
@@ -90,94 +158,181 @@ def extract_audio(input_path: str, output_path: Optional[str] = None, bitrate: s
         raise FileNotFoundError(f"Файл не найден: {input_path}")
     
     # Проверяем расширение файла
-    video_extensions = ['.mp4', '.avi', '.wmv', '.mkv', '.mov', '.flv']
-    audio_extensions = ['.mp3', '.wav', '.m4a', '.aac', '.ogg', '.flac', '.wma']
-    
-    is_video = any(input_path.lower().endswith(ext) for ext in video_extensions)
-    is_audio = any(input_path.lower().endswith(ext) for ext in audio_extensions)
+    ext = os.path.splitext(input_path)[1].lower()
+    is_video = ext in VIDEO_EXTENSIONS
+    is_audio = ext in AUDIO_EXTENSIONS
     
     if not (is_video or is_audio):
         raise ValueError(
             f"Неподдерживаемый формат файла. Поддерживаются:\n"
-            f"Видео: {', '.join(video_extensions)}\n"
-            f"Аудио: {', '.join(audio_extensions)}"
+            f"Видео: {', '.join(sorted(VIDEO_EXTENSIONS))}\n"
+            f"Аудио: {', '.join(sorted(AUDIO_EXTENSIONS))}"
         )
     
+    # Имя файла в каждой строке журнала: при пакетной обработке строки разных файлов перемежаются
+    name = os.path.basename(input_path)
+    encode_path = None
     try:
         # Если выходной путь не указан, создаем его рядом с входным файлом
         if output_path is None:
-            output_path = os.path.splitext(input_path)[0] + '.mp3'
+            output_path = default_output_path(input_path, codec)
         
-        # Создаем временный путь для исходного аудио
-        temp_path = output_path + '.temp.mp3'
+        # FFmpeg не может писать в файл, который читает: для MP3 без явного выходного пути
+        # кодируем во временный файл и подменяем исходный после успешного завершения
+        encode_path = output_path
+        if os.path.abspath(output_path) == os.path.abspath(input_path):
+            encode_path = output_path + '.temp' + os.path.splitext(output_path)[1]
         
         # Создаем папку для выходного файла, если её нет
         os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
         
-        print(f"[1/4] Загрузка файла {input_path}...")
+        logger.info(f"{name}: [1/4] Загрузка файла {input_path}...")
         initial_size = get_file_size_mb(input_path)
-        print(f"      Размер исходного файла: {initial_size:.1f}MB")
+        logger.info(f"{name}: Размер исходного файла: {initial_size:.1f}MB")
         
-        # Обрабатываем в зависимости от типа файла
+        # Обрабатываем в зависимости от типа файла: FFmpeg сам отбрасывает видео,
+        # поэтому в обоих случаях аудио кодируется за один вызов без декодирования в Python
         if is_video:
-            print(f"[2/4] Извлечение аудио дорожки из видео...")
-            with VideoFileClip(input_path) as video:
-                audio = video.audio
-                if audio is None:
-                    raise ValueError("В видео файле отсутствует аудио дорожка")
-                print(f"      Длительность: {video.duration:.1f} сек")
-                print(f"      Начальный битрейт: {bitrate}")
-                audio.write_audiofile(temp_path, bitrate=bitrate)
+            logger.info(f"{name}: [2/4] Извлечение аудио дорожки из видео...")
         else:
-            print(f"[2/4] Обработка аудио файла...")
-            with AudioFileClip(input_path) as audio:
-                print(f"      Длительность: {audio.duration:.1f} сек")
-                print(f"      Начальный битрейт: {bitrate}")
-                audio.write_audiofile(temp_path, bitrate=bitrate)
+            logger.info(f"{name}: [2/4] Обработка аудио файла...")
+        media_info = probe_media(input_path)
+        if not media_info['has_audio']:
+            raise ValueError("В файле отсутствует аудио дорожка")
+        duration = media_info['duration']
+        logger.info(f"{name}: Длительность: {duration:.1f} сек")
+        logger.info(f"{name}: Начальный битрейт: {bitrate}")
         
-        # Проверяем размер полученного файла
-        audio_size = get_file_size_mb(temp_path)
-        print(f"[3/4] Анализ аудио...")
-        print(f"      Размер аудио: {audio_size:.1f}MB")
+        # Размер MP3 с постоянным битрейтом предсказуем по длительности, поэтому битрейт
+        # под лимит выбирается до кодирования и файл кодируется один раз
+        logger.info(f"{name}: [3/4] Анализ аудио...")
+        estimated_size = estimate_size_mb(duration, bitrate)
+        logger.info(f"{name}: Ожидаемый размер аудио: {estimated_size:.1f}MB")
+        if estimated_size > MAX_AUDIO_SIZE_MB:
+            logger.warning(f"{name}: ⚠️ Размер превышает лимит в {MAX_AUDIO_SIZE_MB}MB")
+            bitrate = f"{calculate_bitrate(duration, MAX_AUDIO_SIZE_MB)}k"
+            logger.info(f"{name}: • Расчетный битрейт: {bitrate}")
+        else:
+            logger.info(f"{name}: ✓ Размер в пределах допустимого")
         
-        if audio_size > MAX_AUDIO_SIZE_MB:
-            print(f"      ⚠️ Размер превышает лимит в {MAX_AUDIO_SIZE_MB}MB")
-            print(f"[4/4] Сжатие аудио до допустимого размера...")
-            
-            # Сжимаем до целевого размера
-            compress_audio(temp_path, output_path, MAX_AUDIO_SIZE_MB)
-            
-            # Удаляем временный файл
-            os.remove(temp_path)
+        # VBR (только LAME) при том же качестве обычно дает файл меньше, чем CBR; его средний
+        # битрейт известен заранее, поэтому VBR пробуется, только если ожидаемо укладывается в лимит
+        use_vbr = (codec == 'mp3' and vbr_quality is not None and
+                   estimate_size_mb(duration, f"{LAME_VBR_AVERAGE_KBPS[vbr_quality]}k") <= MAX_AUDIO_SIZE_MB)
+        encoder = aac_encoder() if codec == 'aac' else 'libmp3lame'
+        if use_vbr:
+            logger.info(f"{name}: [4/4] Кодирование аудио в VBR (-q:a {vbr_quality})...")
+            encode_audio(input_path, encode_path, vbr_quality=vbr_quality)
+            vbr_size = get_file_size_mb(encode_path)
+            if vbr_size > MAX_AUDIO_SIZE_MB:
+                logger.warning(f"{name}: ⚠️ VBR дал {vbr_size:.1f}MB, кодируем с постоянным битрейтом {bitrate}")
+                use_vbr = False
         else:
-            print(f"      ✓ Размер в пределах допустимого")
-            print(f"[4/4] Финализация аудио файла...")
-            # Если размер в пределах нормы, просто переименовываем временный файл
-            os.replace(temp_path, output_path)
+            logger.info(f"{name}: [4/4] Кодирование аудио с битрейтом {bitrate}...")
+        if not use_vbr:
+            encode_audio(input_path, encode_path, bitrate, encoder=encoder)
+        if encode_path != output_path:
+            os.replace(encode_path, output_path)
         
         final_size = get_file_size_mb(output_path)
-        print("\n✅ Обработка завершена успешно!")
-        print(f"   • Исходный размер: {initial_size:.1f}MB")
-        print(f"   • Конечный размер: {final_size:.1f}MB")
+        logger.info(f"{name}: ✅ Обработка завершена успешно!")
+        logger.info(f"{name}: • Исходный размер: {initial_size:.1f}MB")
+        logger.info(f"{name}: • Конечный размер: {final_size:.1f}MB")
         
         return output_path
         
     except Exception as e:
-        # Очищаем временные файлы при ошибке
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        # Удаляем недописанный файл при ошибке
+        if encode_path and os.path.exists(encode_path):
+            os.remove(encode_path)
         raise Exception(f"Ошибка при обработке файла: {str(e)}")
 
+def batch_extract(inputs: list[str], bitrate: str = "128k", workers: Optional[int] = None,
+                  codec: str = "mp3", vbr_quality: Optional[int] = 4) -> dict:
+    """
+    Извлекает аудио из нескольких файлов параллельно.
+    
+    Кодирование выполняет внешний процесс FFmpeg, поэтому потоки Python только ждут его
+    завершения; число одновременных файлов ограничено так, чтобы потоки FFmpeg
+    не превышали число ядер.
+    
+    Args:
+        inputs (list[str]): Пути к входным файлам
+        bitrate (str): Начальный битрейт аудио (по умолчанию "128k")
+        workers (Optional[int]): Число файлов, обрабатываемых одновременно
+        codec (str): "mp3" или "aac"
+        vbr_quality (Optional[int]): Качество VBR LAME для MP3 (None - постоянный битрейт)
+    
+    Returns:
+        dict: Входной путь -> путь к MP3 файлу или исключение, если обработка не удалась
+    """
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 1) // FFMPEG_THREADS)
+    # Повторы одного файла обрабатываются один раз. Файлы с одним именем в одной папке (x.mp4 и x.mkv)
+    # не должны писать в один выходной файл, а x.mp4 - перезаписывать входной x.mp3:
+    # при совпадении с чужим входом или уже выбранным выходом к имени добавляется номер
+    inputs = list(dict.fromkeys(inputs))
+    def key(path):
+        return os.path.normcase(os.path.abspath(path))
+    used = {key(path) for path in inputs}
+    output_paths = {}
+    for path in inputs:
+        output_path = default_output_path(path, codec)
+        base, ext = os.path.splitext(output_path)
+        counter = 1
+        # Результат на месте собственного входа допустим: extract_audio кодирует во временный файл
+        while key(output_path) in used and key(output_path) != key(path):
+            output_path = f"{base}_{counter}{ext}"
+            counter += 1
+        used.add(key(output_path))
+        output_paths[path] = output_path
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(workers, len(inputs)) or 1, thread_name_prefix='extract') as pool:
+        futures = {
+            path: pool.submit(extract_audio, path, output_paths[path], bitrate, codec, vbr_quality)
+            for path in inputs
+        }
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = e
+    return results
+
 def main():
     parser = argparse.ArgumentParser(description="Извлечение или конвертация аудио в формат MP3")
-    parser.add_argument("input_path", help="Путь к входному файлу (видео или аудио)")
-    parser.add_argument("-o", "--output", help="Путь для сохранения MP3 файла (опционально)")
+    parser.add_argument("input_path", nargs="+", help="Путь к входному файлу (видео или аудио); можно указать несколько")
+    parser.add_argument("-o", "--output", help="Путь для сохранения MP3 файла (опционально, только для одного файла)")
+    parser.add_argument("-j", "--jobs", type=int, help="Число файлов, обрабатываемых одновременно")
     parser.add_argument("-b", "--bitrate", default="128k", help="Начальный битрейт аудио (по умолчанию 128k)")
+    parser.add_argument("-c", "--codec", choices=["mp3", "aac"], default="mp3",
+                        help="Кодек: mp3 или aac (.m4a, libfdk_aac при наличии); по умолчанию mp3")
+    parser.add_argument("-q", "--vbr-quality", type=int, choices=range(10), default=4,
+                        help="Качество VBR LAME для MP3: 0 - лучшее, 9 - худшее (по умолчанию 4)")
+    parser.add_argument("--cbr", action="store_true",
+                        help="Кодировать MP3 с постоянным битрейтом --bitrate вместо VBR")
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    vbr_quality = None if args.cbr else args.vbr_quality
+    
+    if len(args.input_path) > 1:
+        if args.output:
+            parser.error("--output можно указать только для одного входного файла")
+        results = batch_extract(args.input_path, args.bitrate, args.jobs, args.codec, vbr_quality)
+        failed = False
+        for input_path, result in results.items():
+            if isinstance(result, Exception):
+                failed = True
+                print(f"\nОшибка ({input_path}): {str(result)}")
+            else:
+                print(f"\n{input_path} -> {result}")
+        if failed:
+            exit(1)
+        return
     
     try:
-        output_path = extract_audio(args.input_path, args.output, args.bitrate)
+        output_path = extract_audio(args.input_path[0], args.output, args.bitrate, args.codec, vbr_quality)
         print(f"\nАудио успешно извлечено и сохранено в:\n{output_path}")
     except Exception as e:
         print(f"\nОшибка: {str(e)}")
@@ -0,0 +1,167 @@
+import ctypes
+import importlib.util
+import sys
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# IID_IDXGIFactory1 {770aae78-f26f-4dba-a829-253c83d1b387}
+_IID_IDXGIFactory1 = (0x770aae78, 0xf26f, 0x4dba, (0xa8, 0x29, 0x25, 0x3c, 0x83, 0xd1, 0xb3, 0x87))
+
+# Индексы методов в таблице виртуальных функций COM
+_FACTORY1_ENUM_ADAPTERS1 = 12
+_ADAPTER1_GET_DESC1 = 10
+_RELEASE = 2
+
+_DXGI_ERROR_NOT_FOUND = -2005270526  # 0x887A0002
+_DXGI_ADAPTER_FLAG_SOFTWARE = 2
+
+
+class _GUID(ctypes.Structure):
+    _fields_ = [
+        ('Data1', ctypes.c_ulong),
+        ('Data2', ctypes.c_ushort),
+        ('Data3', ctypes.c_ushort),
+        ('Data4', ctypes.c_ubyte * 8),
+    ]
+
+
+class _LUID(ctypes.Structure):
+    _fields_ = [
+        ('LowPart', ctypes.c_ulong),
+        ('HighPart', ctypes.c_long),
+    ]
+
+
+class _DXGI_ADAPTER_DESC1(ctypes.Structure):
+    _fields_ = [
+        ('Description', ctypes.c_wchar * 128),
+        ('VendorId', ctypes.c_uint),
+        ('DeviceId', ctypes.c_uint),
+        ('SubSysId', ctypes.c_uint),
+        ('Revision', ctypes.c_uint),
+        ('DedicatedVideoMemory', ctypes.c_size_t),
+        ('DedicatedSystemMemory', ctypes.c_size_t),
+        ('SharedSystemMemory', ctypes.c_size_t),
+        ('AdapterLuid', _LUID),
+        ('Flags', ctypes.c_uint),
+    ]
+
+
+def _com_method(obj, index, *argtypes):
+    """Возвращает вызываемый метод COM-объекта по индексу в vtable"""
+    vtable = ctypes.cast(obj, ctypes.POINTER(ctypes.POINTER(ctypes.c_void_p))).contents
+    prototype = ctypes.WINFUNCTYPE(ctypes.c_long, ctypes.c_void_p, *argtypes)
+    return prototype(vtable[index])
+
+
+def enumerate_dxgi_gpus() -> list:
+    """
+    Перечисляет видеоадаптеры через DXGI (только Windows).
+
+    В отличие от WMI не требует инициализации COM-прокси и выполняется за миллисекунды.
+
+    Returns:
+        list: Список словарей с ключами name, vendor_id, dedicated_memory (в байтах)
+
+    Raises:
+        OSError: Если DXGI недоступен
+    """
+    if sys.platform != 'win32':
+        raise OSError("DXGI доступен только в Windows")
+
+    dxgi = ctypes.WinDLL('dxgi')
+    create_factory = dxgi.CreateDXGIFactory1
+    create_factory.restype = ctypes.c_long
+    create_factory.argtypes = [ctypes.POINTER(_GUID), ctypes.POINTER(ctypes.c_void_p)]
+
+    data1, data2, data3, data4 = _IID_IDXGIFactory1
+    iid = _GUID(data1, data2, data3, (ctypes.c_ubyte * 8)(*data4))
+    factory = ctypes.c_void_p()
+    hr = create_factory(ctypes.byref(iid), ctypes.byref(factory))
+    if hr < 0:
+        raise OSError(f"CreateDXGIFactory1 failed: 0x{hr & 0xFFFFFFFF:08X}")
+
+    gpus = []
+    try:
+        enum_adapters = _com_method(factory, _FACTORY1_ENUM_ADAPTERS1, ctypes.c_uint, ctypes.POINTER(ctypes.c_void_p))
+        index = 0
+        while True:
+            adapter = ctypes.c_void_p()
+            hr = enum_adapters(factory, index, ctypes.byref(adapter))
+            if hr == _DXGI_ERROR_NOT_FOUND:
+                break
+            if hr < 0:
+                raise OSError(f"EnumAdapters1 failed: 0x{hr & 0xFFFFFFFF:08X}")
+            try:
+                desc = _DXGI_ADAPTER_DESC1()
+                get_desc = _com_method(adapter, _ADAPTER1_GET_DESC1, ctypes.POINTER(_DXGI_ADAPTER_DESC1))
+                if get_desc(adapter, ctypes.byref(desc)) >= 0 and not desc.Flags & _DXGI_ADAPTER_FLAG_SOFTWARE:
+                    gpus.append({
+                        'name': desc.Description,
+                        'vendor_id': desc.VendorId,
+                        'dedicated_memory': desc.DedicatedVideoMemory,
+                    })
+            finally:
+                _com_method(adapter, _RELEASE)(adapter)
+            index += 1
+    finally:
+        _com_method(factory, _RELEASE)(factory)
+
+    return gpus
+
+
+@dataclass(frozen=True)
+class DeviceInfo:
+    """Свойства одного CUDA-устройства"""
+    name: str
+    total_memory: int
+    multi_processor_count: int
+    major: int
+    minor: int
+
+
+@dataclass(frozen=True)
+class GpuSnapshot:
+    """Снимок состояния CUDA/MPS, сделанный один раз за время жизни процесса"""
+    torch_installed: bool
+    available: bool
+    cuda_version: Optional[str]
+    cudnn_version: Optional[str]
+    devices: Tuple[DeviceInfo, ...]
+    mps_available: bool
+
+
+_snapshot: Optional[GpuSnapshot] = None
+
+
+def gpu_snapshot() -> GpuSnapshot:
+    """
+    Возвращает снимок CUDA-окружения, опрашивая torch только при первом вызове.
+
+    Количество и свойства устройств фиксируются в момент первого вызова, поэтому
+    CUDA_VISIBLE_DEVICES должен быть задан до него (как и для самого torch).
+    Если torch не установлен, он не импортируется и снимок помечается как недоступный.
+    """
+    global _snapshot
+    if _snapshot is not None:
+        return _snapshot
+
+    if importlib.util.find_spec('torch') is None:
+        _snapshot = GpuSnapshot(False, False, None, None, (), False)
+        return _snapshot
+
+    import torch
+    available = torch.cuda.is_available()
+    devices = ()
+    cuda_version = cudnn_version = None
+    if available:
+        cuda_version = torch.version.cuda
+        cudnn_version = str(torch.backends.cudnn.version()) if torch.backends.cudnn.is_available() else 'недоступна'
+        devices = tuple(
+            DeviceInfo(props.name, props.total_memory, props.multi_processor_count, props.major, props.minor)
+            for props in map(torch.cuda.get_device_properties, range(torch.cuda.device_count()))
+        )
+    mps_available = hasattr(torch.backends, 'mps') and torch.backends.mps.is_available()
+
+    _snapshot = GpuSnapshot(True, available, cuda_version, cudnn_version, devices, mps_available)
+    return _snapshot
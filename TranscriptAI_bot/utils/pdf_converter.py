@@ -1,128 +1,178 @@
 import os
+import io
+import functools
+import hashlib
+import html
+import re
 import markdown
 from datetime import datetime
 import subprocess
-import tempfile
 import shutil
 from pathlib import Path
 from config import (
     WKHTMLTOPDF_PATH, PANDOC_PATH,
-    PDF_MARGIN, PDF_FONT, PDF_PAGE_SIZE, PDF_DPI,
-    TEMP_DIRECTORY
+    PDF_MARGIN, PDF_FONT, PDF_PAGE_SIZE, PDF_DPI, PDF_USE_PANDOC,
+    TEMP_DIRECTORY, PDF_TEMPLATE_DIR
 )
 
+CSS_TEXT = """
+body {
+    font-family: Arial, sans-serif;
+    font-size: 14pt;
+    line-height: 1.6;
+    margin: 1cm;
+    max-width: 21cm;
+    padding: 1cm;
+}
+h1 { 
+    font-size: 28pt; 
+    margin-bottom: 1em;
+    border-bottom: 2px solid #000;
+    padding-bottom: 0.2em;
+}
+h2 { 
+    font-size: 22pt; 
+    margin-top: 1.5em;
+    border-bottom: 1px solid #666;
+    padding-bottom: 0.2em;
+}
+h3 { 
+    font-size: 18pt; 
+}
+p {
+    margin: 0.8em 0;
+}
+a { 
+    color: #0066cc;
+    text-decoration: underline;
+}
+strong {
+    color: #000;
+}
+pre {
+    background-color: #f5f5f5;
+    padding: 1em;
+    border-radius: 5px;
+    overflow-x: auto;
+}
+code {
+    font-family: 'Courier New', Courier, monospace;
+    background-color: #f5f5f5;
+    padding: 0.2em 0.4em;
+    border-radius: 3px;
+}
+blockquote {
+    margin: 1em 0;
+    padding-left: 1em;
+    border-left: 4px solid #ddd;
+    color: #666;
+}
+"""
+
+# HTML-обертка для быстрого пути (markdown -> HTML без pandoc); стили встраиваются один раз
+HTML_TEMPLATE = (
+    '<!DOCTYPE html>\n<html lang="ru">\n<head>\n<meta charset="UTF-8">\n'
+    '<title>{title}</title>\n<style>' + CSS_TEXT.replace('{', '{{').replace('}', '}}') + '</style>\n'
+    '</head>\n<body>\n{body}\n</body>\n</html>\n'
+)
+
+# Общие параметры wkhtmltopdf для обоих путей конвертации
+WKHTMLTOPDF_OPTIONS = [
+    '--margin-top', PDF_MARGIN,
+    '--margin-right', PDF_MARGIN,
+    '--margin-bottom', PDF_MARGIN,
+    '--margin-left', PDF_MARGIN,
+    '--page-size', PDF_PAGE_SIZE,
+    '--dpi', str(PDF_DPI)
+]
+
+# Символы, недопустимые в имени PDF: \w в Unicode-режиме совпадает с str.isalnum() плюс '_'
+_UNSAFE_TITLE_RE = re.compile(r'[^\w \-]+')
+
+@functools.lru_cache(maxsize=None)
+def _tool_ok(path):
+    """Проверяет наличие исполняемого файла (результат кэшируется на время работы процесса)"""
+    return os.path.exists(path)
+
 class PDFConverter:
     def __init__(self):
         self.temp_dir = TEMP_DIRECTORY
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
+        os.makedirs(self.temp_dir, exist_ok=True)
         
         # Проверяем наличие необходимых инструментов
-        if not os.path.exists(WKHTMLTOPDF_PATH):
+        if not _tool_ok(WKHTMLTOPDF_PATH):
             raise Exception(f"wkhtmltopdf not found at {WKHTMLTOPDF_PATH}")
-        if not os.path.exists(PANDOC_PATH):
+        if PDF_USE_PANDOC and not _tool_ok(PANDOC_PATH):
             raise Exception(f"pandoc not found at {PANDOC_PATH}")
 
-    def md_to_pdf(self, markdown_text, title):
-        """Convert markdown to PDF using pandoc"""
-        try:
-            # Создаем временный MD файл
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False, encoding='utf-8') as temp_md:
-                temp_md.write(markdown_text)
-                temp_md_path = temp_md.name
-
-            # Создаем временный HTML файл для стилей
-            css = """
-                body {
-                    font-family: Arial, sans-serif;
-                    font-size: 14pt;
-                    line-height: 1.6;
-                    margin: 1cm;
-                    max-width: 21cm;
-                    padding: 1cm;
-                }
-                h1 { 
-                    font-size: 28pt; 
-                    margin-bottom: 1em;
-                    border-bottom: 2px solid #000;
-                    padding-bottom: 0.2em;
-                }
-                h2 { 
-                    font-size: 22pt; 
-                    margin-top: 1.5em;
-                    border-bottom: 1px solid #666;
-                    padding-bottom: 0.2em;
-                }
-                h3 { 
-                    font-size: 18pt; 
-                }
-                p {
-                    margin: 0.8em 0;
-                }
-                a { 
-                    color: #0066cc;
-                    text-decoration: underline;
-                }
-                strong {
-                    color: #000;
-                }
-                pre {
-                    background-color: #f5f5f5;
-                    padding: 1em;
-                    border-radius: 5px;
-                    overflow-x: auto;
-                }
-                code {
-                    font-family: 'Courier New', Courier, monospace;
-                    background-color: #f5f5f5;
-                    padding: 0.2em 0.4em;
-                    border-radius: 3px;
-                }
-                blockquote {
-                    margin: 1em 0;
-                    padding-left: 1em;
-                    border-left: 4px solid #ddd;
-                    color: #666;
-                }
-            """
-            
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.css', delete=False, encoding='utf-8') as temp_css:
-                temp_css.write(css)
-                temp_css_path = temp_css.name
+        # Для pandoc стили пишутся на диск один раз (в templates, который не очищается вместе с temp);
+        # хэш в имени файла обновляет его при изменении CSS_TEXT
+        css_hash = hashlib.md5(CSS_TEXT.encode('utf-8')).hexdigest()[:8]
+        self._css_path = os.path.join(PDF_TEMPLATE_DIR, f'pdf_style_{css_hash}.css')
+        if PDF_USE_PANDOC and not os.path.exists(self._css_path):
+            with open(self._css_path, 'w', encoding='utf-8') as css_file:
+                css_file.write(CSS_TEXT)
 
+    def _pandoc_command(self, output_args):
+        """Команда pandoc -> wkhtmltopdf (markdown читается из stdin)"""
+        cmd = [
+            PANDOC_PATH,
+            '-',  # Markdown читается из stdin
+            *output_args,
+            '--pdf-engine=' + WKHTMLTOPDF_PATH,
+            '--variable', f'geometry:margin={PDF_MARGIN}',
+            '--variable', f'mainfont:{PDF_FONT}',
+            '--css', self._css_path,
+            '--standalone'
+        ]
+        # Добавляем параметры для wkhtmltopdf
+        for option in WKHTMLTOPDF_OPTIONS:
+            cmd.append(f'--pdf-engine-opt={option}')
+        return cmd
+
+    def md_to_pdf(self, markdown_text, title, stream=False):
+        """
+        Convert markdown to PDF.
+        
+        По умолчанию markdown преобразуется в HTML в процессе и передается
+        напрямую в wkhtmltopdf; при PDF_USE_PANDOC используется pandoc.
+        При stream=True PDF не сохраняется на диск: конвертер пишет его в stdout,
+        и функция возвращает io.BytesIO с атрибутом name (имя файла для отправки).
+        """
+        tool = 'pandoc' if PDF_USE_PANDOC else 'wkhtmltopdf'
+        try:
             # Генерируем имя для PDF
-            safe_title = "".join(x for x in title if x.isalnum() or x in (' ', '-', '_')).rstrip()
+            safe_title = _UNSAFE_TITLE_RE.sub('', title).rstrip()
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            pdf_path = os.path.join(self.temp_dir, f'{safe_title}_{timestamp}.pdf')
-
-            # Конвертируем в PDF используя pandoc
-            cmd = [
-                PANDOC_PATH,
-                temp_md_path,
-                '-o', pdf_path,
-                '--pdf-engine=' + WKHTMLTOPDF_PATH,
-                '--variable', f'geometry:margin={PDF_MARGIN}',
-                '--variable', f'mainfont:{PDF_FONT}',
-                '--css', temp_css_path,
-                '--standalone'
-            ]
-
-            # Добавляем параметры для wkhtmltopdf
-            wk_options = [
-                '--pdf-engine-opt=--margin-top', f'--pdf-engine-opt={PDF_MARGIN}',
-                '--pdf-engine-opt=--margin-right', f'--pdf-engine-opt={PDF_MARGIN}',
-                '--pdf-engine-opt=--margin-bottom', f'--pdf-engine-opt={PDF_MARGIN}',
-                '--pdf-engine-opt=--margin-left', f'--pdf-engine-opt={PDF_MARGIN}',
-                '--pdf-engine-opt=--page-size', f'--pdf-engine-opt={PDF_PAGE_SIZE}',
-                '--pdf-engine-opt=--dpi', f'--pdf-engine-opt={PDF_DPI}'
-            ]
-            cmd.extend(wk_options)
-            
-            result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+            pdf_name = f'{safe_title}_{timestamp}.pdf'
+            pdf_path = os.path.join(self.temp_dir, pdf_name)
+            output = '-' if stream else pdf_path
+
+            if PDF_USE_PANDOC:
+                output_args = ['-t', 'pdf', '-o', '-'] if stream else ['-o', pdf_path]
+                cmd = self._pandoc_command(output_args)
+                document = markdown_text
+            else:
+                body = markdown.markdown(markdown_text, extensions=['extra', 'toc'])
+                document = HTML_TEMPLATE.format(title=html.escape(title), body=body)
+                cmd = [WKHTMLTOPDF_PATH, '--quiet', '--encoding', 'utf-8', *WKHTMLTOPDF_OPTIONS, '-', output]
             
-            # Удаляем временные файлы
-            os.unlink(temp_md_path)
-            os.unlink(temp_css_path)
+            # Оба конвертера читают stdin как UTF-8, поэтому передаем уже закодированные байты
+            # stdout нужен только для PDF в памяти; stderr читается лишь при ошибке
+            result = subprocess.run(
+                cmd,
+                input=document.encode('utf-8'),
+                check=True,
+                stdout=subprocess.PIPE if stream else subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
+
+            if stream:
+                if not result.stdout:
+                    raise Exception(f"{tool} returned an empty PDF")
+                pdf_stream = io.BytesIO(result.stdout)
+                pdf_stream.name = pdf_name
+                return pdf_stream
 
             if not os.path.exists(pdf_path):
                 raise Exception(f"PDF file was not created at {pdf_path}")
@@ -130,11 +180,19 @@ class PDFConverter:
             return pdf_path
 
         except subprocess.CalledProcessError as e:
-            raise Exception(f"Error running pandoc: {e.stderr}")
+            raise Exception(f"Error running {tool}: {e.stderr.decode('utf-8', errors='replace')}")
         except Exception as e:
             raise Exception(f"Error converting markdown to PDF: {str(e)}")
 
-def generate_pdf(markdown_text, title="Notes"):
-    """Wrapper function to generate PDF from markdown text"""
-    converter = PDFConverter()
-    return converter.md_to_pdf(markdown_text, title)
+_CONVERTER = None
+
+def get_converter():
+    """Возвращает общий экземпляр PDFConverter (создается при первом вызове)"""
+    global _CONVERTER
+    if _CONVERTER is None:
+        _CONVERTER = PDFConverter()
+    return _CONVERTER
+
+def generate_pdf(markdown_text, title="Notes", *, stream=False):
+    """Wrapper function to generate PDF from markdown text (path or BytesIO when stream=True)"""
+    return get_converter().md_to_pdf(markdown_text, title, stream=stream)
@@ -1,42 +1,75 @@
 import telegram
 from telegram import Update, Bot
+from telegram.ext import AIORateLimiter, ExtBot
 import config
 import logging
-from utils.pdf_converter import PDFConverter
+from utils.pdf_converter import get_converter
 import os
 import asyncio
-import aiofiles
+from typing import Awaitable, BinaryIO, Optional, Union
 
 logger = logging.getLogger(__name__)
 
-class TelegramSender:
-    def __init__(self, transcript_bot_token, obsimatic_bot_token, group_chat_id=None):
-        """Initialize TelegramSender with bot tokens"""
-        self.logger = logging.getLogger(__name__)
-        
-        # Инициализация ботов с увеличенным таймаутом
-        self.transcript_bot = telegram.Bot(token=transcript_bot_token, request=telegram.request.HTTPXRequest(
-            connection_pool_size=8,
-            read_timeout=30,
-            write_timeout=30,
-            connect_timeout=30,
-            pool_timeout=30
-        ))
-        self.obsimatic_bot = telegram.Bot(token=obsimatic_bot_token, request=telegram.request.HTTPXRequest(
+# Таблица экранирования специальных символов Markdown V2 (включая обратный слэш)
+_MARKDOWN_V2_ESCAPE = str.maketrans({char: f'\\{char}' for char in '_*[]()~`>#+-=|{}!.\\'})
+
+def make_rate_limiter() -> AIORateLimiter:
+    """Ограничитель запросов по лимитам Bot API: общий темп и сообщения в группы"""
+    return AIORateLimiter(
+        overall_max_rate=30,
+        overall_time_period=1,
+        group_max_rate=20,
+        group_time_period=60
+    )
+
+# Боты по токену: каждый новый экземпляр Bot открывает собственный пул HTTP-соединений,
+# поэтому отправители с одним токеном используют один бот и его соединения
+_BOTS = {}
+
+def _get_bot(token):
+    """
+    Возвращает общий экземпляр бота для токена, создавая его при первом обращении.
+    Бот создается с собственным AIORateLimiter; для токена приложения его заменяет
+    бот приложения (см. TelegramSender.use_application_bot).
+    """
+    bot = _BOTS.get(token)
+    if bot is None:
+        bot = _BOTS[token] = ExtBot(token=token, request=telegram.request.HTTPXRequest(
             connection_pool_size=8,
             read_timeout=30,
             write_timeout=30,
             connect_timeout=30,
             pool_timeout=30
-        ))
+        ), rate_limiter=make_rate_limiter())
+    return bot
+
+class TelegramSender:
+    def __init__(self, transcript_bot_token, obsimatic_bot_token, group_chat_id=None):
+        """Initialize TelegramSender with bot tokens"""
+        self.logger = logging.getLogger(__name__)
+        
+        # Боты с увеличенным таймаутом общие для всех экземпляров (по токену)
+        self.transcript_bot = _get_bot(transcript_bot_token)
+        self.obsimatic_bot = _get_bot(obsimatic_bot_token)
         self.group_chat_id = group_chat_id
-        self.pdf_converter = PDFConverter()
+        self.pdf_converter = get_converter()
         
+    def use_application_bot(self, bot: ExtBot):
+        """
+        Переключает отправку с токеном приложения на бота приложения: тогда send_notes и
+        send_document проходят через тот же AIORateLimiter, что и ответы обработчиков.
+        """
+        _BOTS[bot.token] = bot
+        if self.transcript_bot is not None and self.transcript_bot.token == bot.token:
+            self.transcript_bot = bot
+        if self.obsimatic_bot is not None and self.obsimatic_bot.token == bot.token:
+            self.obsimatic_bot = bot
+
     async def _ensure_bots(self):
         """Проверяет и при необходимости инициализирует ботов"""
         if config.DEBUG_MODE:
             if self.transcript_bot is None and config.TRANSCRIPT_BOT_TOKEN:
-                self.transcript_bot = telegram.Bot(token=config.TRANSCRIPT_BOT_TOKEN)
+                self.transcript_bot = _get_bot(config.TRANSCRIPT_BOT_TOKEN)
                 logger.info("TranscriptAI bot initialized")
         else:
             self.transcript_bot = None
@@ -46,17 +79,23 @@ class TelegramSender:
         if not text:
             return ""
             
-        # Экранируем все специальные символы Markdown V2
-        escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '!', '.', '\\']
-        
-        # Сначала экранируем обратный слэш, чтобы не экранировать уже экранированные символы
-        text = text.replace('\\', '\\\\')
-        
-        for char in escape_chars:
-            if char != '\\':  # Пропускаем обратный слэш, так как уже обработали
-                text = text.replace(char, f'\\{char}')
-        
-        return text
+        # Все специальные символы Markdown V2 экранируются за один проход
+        return text.translate(_MARKDOWN_V2_ESCAPE)
+
+    async def _reply_with_retry(self, update: Update, text: str, parse_mode=None, attempts: int = 3):
+        """
+        Отвечает на сообщение; при флуд-контроле ждет столько, сколько указал Telegram.
+        Темп отправки задает AIORateLimiter приложения, поэтому фиксированная пауза не нужна.
+        """
+        for attempt in range(attempts):
+            try:
+                return await update.message.reply_text(text=text, parse_mode=parse_mode)
+            except telegram.error.RetryAfter as e:
+                if attempt == attempts - 1:
+                    raise
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                self.logger.warning(f"Flood control, retrying in {retry_after} s")
+                await asyncio.sleep(retry_after)
 
     async def send_long_message(self, update: Update, text: str, send_to_user=True):
         """
@@ -72,25 +111,29 @@ class TelegramSender:
         EFFECTIVE_LENGTH = MAX_MESSAGE_LENGTH - PART_HEADER_LENGTH
         
         try:
-            # Разбиваем текст на части, учитывая переносы строк
+            # Разбиваем текст на части, учитывая переносы строк: строки копятся в списке
+            # с текущей длиной, а не склеиваются в строку на каждой итерации
             parts = []
-            current_part = ""
+            current_lines = []
+            current_length = 0
             
             for line in text.split('\n'):
-                if len(current_part + line + '\n') > EFFECTIVE_LENGTH:
-                    if current_part:
-                        parts.append(current_part.strip())
-                        current_part = line + '\n'
-                    else:
-                        # Если строка слишком длинная, разбиваем ее
-                        while line:
-                            parts.append(line[:EFFECTIVE_LENGTH])
-                            line = line[EFFECTIVE_LENGTH:]
-                else:
-                    current_part += line + '\n'
+                if current_length + len(line) + 1 > EFFECTIVE_LENGTH:
+                    if current_lines:
+                        parts.append('\n'.join(current_lines).strip())
+                        current_lines = []
+                        current_length = 0
+                    # Если строка слишком длинная, разбиваем ее
+                    while len(line) + 1 > EFFECTIVE_LENGTH:
+                        parts.append(line[:EFFECTIVE_LENGTH])
+                        line = line[EFFECTIVE_LENGTH:]
+                current_lines.append(line)
+                current_length += len(line) + 1
             
-            if current_part:
-                parts.append(current_part.strip())
+            if current_lines:
+                last_part = '\n'.join(current_lines).strip()
+                if last_part:
+                    parts.append(last_part)
             
             total_parts = len(parts)
             
@@ -104,21 +147,16 @@ class TelegramSender:
                     
                     # Пробуем отправить с Markdown
                     try:
-                        await update.message.reply_text(
-                            text=message_text,
-                            parse_mode='Markdown'
-                        )
+                        await self._reply_with_retry(update, message_text, parse_mode='Markdown')
                     except Exception as md_error:
                         self.logger.warning(f"Failed to send with Markdown: {str(md_error)}")
                         # Пробуем отправить без форматирования
                         try:
-                            await update.message.reply_text(message_text)
+                            await self._reply_with_retry(update, message_text)
                         except Exception as plain_error:
                             self.logger.error(f"Failed to send message part {i}/{total_parts}: {str(plain_error)}")
                             continue
                     
-                    await asyncio.sleep(1)  # Пауза между отправкой частей
-                    
                 except Exception as e:
                     self.logger.error(f"Error sending part {i}/{total_parts}: {str(e)}")
                     continue
@@ -174,8 +212,15 @@ class TelegramSender:
         
         return chunks
 
-    async def send_notes(self, chat_id: int, notes: str, title: str = "Notes") -> None:
-        """Send notes to chat with markdown formatting and as PDF"""
+    async def send_notes(self, chat_id: int, notes: str, title: str = "Notes",
+                         pdf: Optional[Awaitable[BinaryIO]] = None) -> None:
+        """
+        Send notes to chat with markdown formatting and as PDF.
+        
+        pdf - уже запущенная генерация PDF (задача или корутина, возвращающая поток);
+        ожидается после отправки текста, чтобы документ формировался параллельно с ней.
+        Если не задана, PDF конвертируется здесь же.
+        """
         try:
             # Convert chat_id to int if it's a string
             try:
@@ -212,22 +257,19 @@ class TelegramSender:
 
             # Generate and send PDF
             try:
-                pdf_path = self.pdf_converter.md_to_pdf(notes, title)
+                if pdf is not None:
+                    pdf_stream = await pdf
+                else:
+                    # Конвертация блокирующая, поэтому выполняется в потоке; PDF формируется в памяти
+                    pdf_stream = await asyncio.to_thread(self.pdf_converter.md_to_pdf, notes, title, True)
                 
-                try:
-                    # Отправляем PDF в тот же чат, что и markdown
-                    async with aiofiles.open(pdf_path, 'rb') as pdf_file:
-                        pdf_data = await pdf_file.read()
-                        await self.obsimatic_bot.send_document(
-                            chat_id=chat_id,
-                            document=pdf_data,
-                            filename=f"{title}.pdf",
-                            caption=f"Транскрипция: {title}"
-                        )
-                finally:
-                    # Удаляем временный PDF файл
-                    if os.path.exists(pdf_path):
-                        os.remove(pdf_path)
+                # Отправляем PDF в тот же чат, что и markdown
+                await self.obsimatic_bot.send_document(
+                    chat_id=chat_id,
+                    document=pdf_stream,
+                    filename=f"{title}.pdf",
+                    caption=f"Транскрипция: {title}"
+                )
             except Exception as e:
                 self.logger.error(f"Error sending PDF: {str(e)}")
                 raise
@@ -235,17 +277,27 @@ class TelegramSender:
             self.logger.error(f"Error in send_notes: {str(e)}")
             raise
 
-    async def send_document(self, file_path: str, chat_id: int, update: Update):
-        """Send a document to the specified chat"""
+    async def _send_document_data(self, document: BinaryIO, chat_id: int, filename: str):
+        """Отправляет открытый файл или поток в чат"""
+        await self.transcript_bot.send_document(
+            chat_id=chat_id,
+            document=document,
+            filename=filename,
+            caption=f"Файл: {filename}"
+        )
+
+    async def send_document(self, file: Union[str, BinaryIO], chat_id: int, update: Update):
+        """Send a document (file path or in-memory stream) to the specified chat"""
         try:
-            async with aiofiles.open(file_path, 'rb') as doc:
-                file_data = await doc.read()
-                await self.transcript_bot.send_document(
-                    chat_id=chat_id,
-                    document=file_data,
-                    filename=os.path.basename(file_path),
-                    caption=f"Файл: {os.path.basename(file_path)}"
-                )
+            if isinstance(file, str):
+                # Файл передается в python-telegram-bot открытым дескриптором: библиотека
+                # читает его сама, без промежуточной копии байтов через aiofiles
+                filename = os.path.basename(file)
+                with open(file, 'rb') as doc:
+                    await self._send_document_data(doc, chat_id, filename)
+            else:
+                filename = os.path.basename(getattr(file, 'name', 'document.pdf'))
+                await self._send_document_data(file, chat_id, filename)
         except Exception as e:
             logger.error(f"Error sending document: {str(e)}")
             await update.message.reply_text(f"Sorry, there was an error sending the document: {str(e)}")
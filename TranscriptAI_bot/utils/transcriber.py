@@ -1,45 +1,210 @@
-import whisper
+import os
+import re
+import contextlib
+import functools
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 from config import (
     OPENAI_API_KEY, WHISPER_LOCAL_MODEL, WHISPER_CLOUD_MODEL,
-    CHAT_MODEL, USE_LOCAL_WHISPER,
+    CHAT_MODEL, USE_LOCAL_WHISPER, WHISPER_BATCH_SIZE, WHISPER_NUM_WORKERS, WHISPER_COMPUTE_TYPE, FFMPEG_THREADS,
+    FFMPEG_EXECUTABLE,
     ANALYSIS_TEMPERATURE, NOTES_TEMPERATURE, NOTES_MAX_TOKENS,
-    NOTES_PRESENCE_PENALTY, NOTES_FREQUENCY_PENALTY,
-    MEETING_PROMPT, COURSE_PROMPT_HEADER, COURSE_PROMPT, COURSE_CONTENT_PROMPT,
-    CONTENT_ANALYSIS_PROMPT, COURSE_CONTENT_FORMAT
+    NOTES_PRESENCE_PENALTY, NOTES_FREQUENCY_PENALTY, NOTES_CHUNK_TOKENS, NOTES_PARALLEL_REQUESTS
 )
+from prompts import MEETING_PROMPT, COURSE_PROMPT_HEADER, COURSE_PROMPT, CONTENT_ANALYSIS_PROMPT, NOTES_MERGE_PROMPT
+
+# Загруженные локальные модели по ключу (модель, устройство, тип вычислений):
+# повторно созданный Transcriber не читает веса с диска заново
+_MODEL_CACHE = {}
+_MODEL_LOCK = threading.Lock()
+
+def _warmup(model):
+    """Прогоняет 30 с тишины через модель, чтобы инициализация CUDA/cuBLAS не попала на первый запрос"""
+    import numpy as np
+    silence = np.zeros(30 * 16000, dtype=np.float32)
+    # Без VAD тишина все равно проходит через энкодер и декодер
+    segments, _ = model.transcribe(silence, beam_size=1, vad_filter=False)
+    for _ in segments:
+        pass
+
+def _load_local_model():
+    """Возвращает общий экземпляр faster-whisper, загружая его при первом обращении"""
+    # faster-whisper (CTranslate2) импортируется только для локальной модели;
+    # INT8-веса примерно в 4 раза быстрее эталонного whisper на CPU и вдвое легче
+    import ctranslate2
+    from faster_whisper import WhisperModel
+    use_cuda = ctranslate2.get_cuda_device_count() > 0
+    device = "cuda" if use_cuda else "cpu"
+    compute_type = WHISPER_COMPUTE_TYPE or ("int8_float16" if use_cuda else "int8")
+    key = (WHISPER_LOCAL_MODEL, device, compute_type)
+    with _MODEL_LOCK:
+        model = _MODEL_CACHE.get(key)
+        if model is None:
+            model = WhisperModel(
+                WHISPER_LOCAL_MODEL,
+                device=device,
+                compute_type=compute_type,
+                # CTranslate2 отпускает GIL, поэтому вызовы из разных потоков
+                # выполняются параллельно, если у модели несколько воркеров
+                num_workers=WHISPER_NUM_WORKERS,
+                # На CPU ядра делятся между воркерами модели за вычетом потоков ffmpeg
+                cpu_threads=0 if use_cuda else max(1, ((os.cpu_count() or 1) - FFMPEG_THREADS) // WHISPER_NUM_WORKERS)
+            )
+            if use_cuda:
+                _warmup(model)
+            # Модель Silero VAD для BatchedInferencePipeline загружается лениво при первой
+            # транскрибации; загружаем ее заранее (get_vad_model кэширует экземпляр)
+            from faster_whisper.vad import get_vad_model
+            get_vad_model()
+            _MODEL_CACHE[key] = model
+        return model
+
+# Длина начала транскрипции, по которому определяется тип контента
+CONTENT_ANALYSIS_CHARS = 1000
+
+# Лимит размера файла OpenAI Whisper API и длительность частей, на которые режутся большие файлы
+CLOUD_UPLOAD_LIMIT = 25 * 1024 * 1024
+CLOUD_CHUNK_SECONDS = 10 * 60
+
+def _split_audio(audio_path, chunk_seconds):
+    """
+    Режет аудио на части по chunk_seconds секунд без перекодирования (сегментный муксер ffmpeg).
+    Возвращает пути к частям по порядку.
+    """
+    base, ext = os.path.splitext(audio_path)
+    # Без расширения формат контейнера не определить, поэтому такие файлы перекодируются в mp3
+    codec_args = ['-c', 'copy'] if ext else ['-acodec', 'libmp3lame', '-ac', '1', '-ar', '16000', '-b:a', '64k']
+    ext = ext or '.mp3'
+    prefix = f"{os.path.basename(base)}_part"
+    command = [
+        FFMPEG_EXECUTABLE, '-threads', str(FFMPEG_THREADS), '-v', 'error',
+        '-i', audio_path, '-vn', *codec_args,
+        '-f', 'segment', '-segment_time', str(chunk_seconds), '-reset_timestamps', '1',
+        '-y', f"{base}_part%03d{ext}"
+    ]
+    process = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise Exception(f"FFmpeg split error: {process.stderr.decode(errors='replace')}")
+    directory = os.path.dirname(audio_path) or '.'
+    with os.scandir(directory) as entries:
+        return sorted(
+            entry.path for entry in entries
+            if entry.name.startswith(prefix) and entry.name.endswith(ext)
+        )
+
+@functools.cache
+def _token_encoding():
+    """Токенизатор tiktoken для CHAT_MODEL (загружается один раз)"""
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(CHAT_MODEL)
+    except KeyError:
+        # Старые версии tiktoken не знают новых моделей
+        return tiktoken.get_encoding("cl100k_base")
+
+def _split_transcript(transcript, max_tokens):
+    """
+    Делит транскрипцию на части не длиннее max_tokens токенов по границам предложений
+    (Whisper возвращает сплошной текст без абзацев). Предложение длиннее max_tokens
+    (текст без знаков препинания) режется на окна ровно по max_tokens токенов.
+    """
+    encoding = _token_encoding()
+    chunks, current, current_tokens = [], [], 0
+    for sentence in re.split(r'(?<=[.!?…])\s+', transcript):
+        tokens = encoding.encode(sentence)
+        if current and current_tokens + len(tokens) > max_tokens:
+            chunks.append(" ".join(current))
+            current, current_tokens = [], 0
+        if len(tokens) > max_tokens:
+            # Целые окна идут отдельными частями, остаток начинает следующую
+            whole = len(tokens) - len(tokens) % max_tokens
+            chunks.extend(encoding.decode(tokens[i:i + max_tokens]) for i in range(0, whole, max_tokens))
+            tokens = tokens[whole:]
+            if not tokens:
+                continue
+            sentence = encoding.decode(tokens)
+        current.append(sentence)
+        current_tokens += len(tokens)
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
 
 class Transcriber:
     def __init__(self):
         self.client = OpenAI(api_key=OPENAI_API_KEY)
         if USE_LOCAL_WHISPER:
-            self.local_model = whisper.load_model(WHISPER_LOCAL_MODEL)
+            from faster_whisper import BatchedInferencePipeline
+            self.local_model = _load_local_model()
+            # VAD режет аудио на окна до 30 с, которые декодируются пачками
+            self.batched_model = BatchedInferencePipeline(model=self.local_model)
 
-    async def transcribe_with_local_whisper(self, audio_path):
-        """Transcribe audio using local Whisper model"""
+    def transcribe_with_local_whisper(self, audio, on_prefix=None):
+        """
+        Transcribe audio (file path or 16 kHz mono float32 array) using local Whisper model.
+        
+        on_prefix (если задан) вызывается один раз из потока распознавания, как только накоплено
+        CONTENT_ANALYSIS_CHARS символов, чтобы анализ типа контента шел параллельно с остальным аудио.
+        """
         try:
-            result = self.local_model.transcribe(audio_path)
-            return result["text"]
+            # transcribe возвращает ленивый генератор сегментов: декодирование идет при итерации
+            segments, _ = self.batched_model.transcribe(
+                audio, beam_size=5, batch_size=WHISPER_BATCH_SIZE
+            )
+            texts = []
+            length = 0
+            for segment in segments:
+                texts.append(segment.text)
+                length += len(segment.text)
+                if on_prefix is not None and length >= CONTENT_ANALYSIS_CHARS:
+                    prefix = "".join(texts).strip()
+                    # После strip начало должно совпадать с началом итогового текста
+                    if len(prefix) >= CONTENT_ANALYSIS_CHARS:
+                        on_prefix(prefix)
+                        on_prefix = None
+            return "".join(texts).strip()
         except Exception as e:
             raise Exception(f"Error during local transcription: {str(e)}")
 
+    def _transcribe_cloud_file(self, audio_path):
+        """Отправляет один файл в OpenAI Whisper API"""
+        with open(audio_path, "rb") as audio_file:
+            return self.client.audio.transcriptions.create(
+                model=WHISPER_CLOUD_MODEL,
+                file=audio_file,
+                response_format="text"
+            )
+
     def transcribe_with_cloud_whisper(self, audio_path):
-        """Transcribe audio using OpenAI Whisper API"""
+        """
+        Transcribe audio using OpenAI Whisper API.
+        
+        Файлы больше лимита API режутся на части по CLOUD_CHUNK_SECONDS, которые
+        распознаются параллельно, а тексты склеиваются по порядку.
+        """
         try:
-            with open(audio_path, "rb") as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model=WHISPER_CLOUD_MODEL,
-                    file=audio_file,
-                    response_format="text"
-                )
-            return transcript
+            if os.path.getsize(audio_path) <= CLOUD_UPLOAD_LIMIT:
+                return self._transcribe_cloud_file(audio_path)
+            chunks = _split_audio(audio_path, CLOUD_CHUNK_SECONDS)
+            try:
+                with ThreadPoolExecutor(max_workers=min(4, len(chunks)), thread_name_prefix='whisper_chunk') as pool:
+                    texts = list(pool.map(self._transcribe_cloud_file, chunks))
+            finally:
+                for chunk in chunks:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(chunk)
+            return " ".join(text.strip() for text in texts)
         except Exception as e:
             raise Exception(f"Error during cloud transcription: {str(e)}")
 
-    def transcribe_with_whisper(self, audio_path):
-        """Transcribe audio using selected Whisper model (local or cloud)"""
+    def transcribe_with_whisper(self, audio_path, on_prefix=None):
+        """
+        Transcribe audio using selected Whisper model (local or cloud).
+        on_prefix поддерживается только локальной моделью: облачный API возвращает текст целиком.
+        """
         if USE_LOCAL_WHISPER:
-            return self.transcribe_with_local_whisper(audio_path)
+            return self.transcribe_with_local_whisper(audio_path, on_prefix)
         else:
             return self.transcribe_with_cloud_whisper(audio_path)
 
@@ -50,7 +215,7 @@ class Transcriber:
                 model=CHAT_MODEL,
                 messages=[
                     {"role": "system", "content": CONTENT_ANALYSIS_PROMPT},
-                    {"role": "user", "content": transcript[:1000]}  # Send first 1000 chars for analysis
+                    {"role": "user", "content": transcript[:CONTENT_ANALYSIS_CHARS]}  # Send first 1000 chars for analysis
                 ],
                 temperature=ANALYSIS_TEMPERATURE
             )
@@ -58,6 +223,21 @@ class Transcriber:
         except Exception as e:
             raise Exception(f"Error during content type analysis: {str(e)}")
 
+    def _complete_notes(self, system_prompt, text):
+        """Один запрос генерации заметок с общими параметрами"""
+        response = self.client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": text}
+            ],
+            temperature=NOTES_TEMPERATURE,
+            max_tokens=NOTES_MAX_TOKENS,
+            presence_penalty=NOTES_PRESENCE_PENALTY,
+            frequency_penalty=NOTES_FREQUENCY_PENALTY
+        )
+        return response.choices[0].message.content
+
     def generate_notes(self, transcript, content_type, audio_info):
         """Generate structured notes using OpenAI"""
         try:
@@ -76,33 +256,25 @@ class Transcriber:
                 content_type = self.analyze_content_type(transcript)
 
             # Генерируем заметки в зависимости от типа контента
-            if content_type == "meeting":
-                notes_response = self.client.chat.completions.create(
-                    model=CHAT_MODEL,
-                    messages=[
-                        {"role": "system", "content": MEETING_PROMPT},
-                        {"role": "user", "content": transcript}
-                    ],
-                    temperature=NOTES_TEMPERATURE,
-                    max_tokens=NOTES_MAX_TOKENS,
-                    presence_penalty=NOTES_PRESENCE_PENALTY,
-                    frequency_penalty=NOTES_FREQUENCY_PENALTY
-                )
+            # (для курсов и других типов контента используется промпт курса)
+            system_prompt = MEETING_PROMPT if content_type == "meeting" else COURSE_PROMPT
+
+            if len(_token_encoding().encode(transcript)) <= NOTES_CHUNK_TOKENS:
+                chunks = [transcript]
+            else:
+                chunks = _split_transcript(transcript, NOTES_CHUNK_TOKENS)
+            if len(chunks) == 1:
+                notes = self._complete_notes(system_prompt, chunks[0])
             else:
-                # Для курсов и других типов контента
-                notes_response = self.client.chat.completions.create(
-                    model=CHAT_MODEL,
-                    messages=[
-                        {"role": "system", "content": COURSE_PROMPT},
-                        {"role": "user", "content": transcript}
-                    ],
-                    temperature=NOTES_TEMPERATURE,
-                    max_tokens=NOTES_MAX_TOKENS,
-                    presence_penalty=NOTES_PRESENCE_PENALTY,
-                    frequency_penalty=NOTES_FREQUENCY_PENALTY
+                # Длинная транскрипция конспектируется по частям параллельно,
+                # затем конспекты частей сводятся в один запросом с тем же промптом
+                with ThreadPoolExecutor(max_workers=min(NOTES_PARALLEL_REQUESTS, len(chunks)), thread_name_prefix='notes_chunk') as pool:
+                    partial_notes = list(pool.map(lambda chunk: self._complete_notes(system_prompt, chunk), chunks))
+                merged = "\n\n".join(
+                    f"Часть {number}:\n{part}" for number, part in enumerate(partial_notes, 1)
                 )
+                notes = self._complete_notes(system_prompt, NOTES_MERGE_PROMPT + merged)
 
-            notes = notes_response.choices[0].message.content
             return f"{header}\n\n{notes}"
 
         except Exception as e:
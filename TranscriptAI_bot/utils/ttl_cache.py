@@ -0,0 +1,44 @@
+import time
+import threading
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Потокобезопасный кэш в памяти с временем жизни записей и ограничением размера.
+
+    Записи хранятся в порядке последнего обращения: при переполнении вытесняется самая
+    давняя, а устаревшие записи удаляются при чтении и при каждой записи в кэш.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # ключ -> (время истечения, значение)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Возвращает значение по ключу или default, если записи нет или она устарела"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        """Сохраняет значение, удаляя устаревшие записи и самые давние сверх maxsize"""
+        with self._lock:
+            now = time.monotonic()
+            self._data[key] = (now + self.ttl, value)
+            self._data.move_to_end(key)
+            expired = [k for k, (expires, _) in self._data.items() if expires <= now]
+            for k in expired:
+                del self._data[k]
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
@@ -1,4 +1,19 @@
+import re
+import asyncio
+import threading
 import yt_dlp
+import config
+from utils.ttl_cache import TTLCache
+
+# Таблица экранирования специальных символов Markdown и символы вне BMP (эмодзи и т.п.)
+_MARKDOWN_ESCAPE = str.maketrans({char: '\\' + char for char in '_*[]()~`>=|{}!"'})
+_NON_BMP_RE = re.compile('[\U00010000-\U0010FFFF]')
+
+# ID видео из любых форм ссылки (watch, youtu.be, shorts, embed) - ключ кэша метаданных
+_VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|shorts/|embed/|v/)(?P<id>[A-Za-z0-9_-]{11})')
+
+# Кэш метаданных: video_id -> информация о видео (ограничен по размеру и времени жизни)
+_INFO_CACHE = TTLCache(config.YOUTUBE_INFO_CACHE_SIZE, config.YOUTUBE_INFO_CACHE_TTL)
 
 class YouTubeInfo:
     def __init__(self):
@@ -7,13 +22,26 @@ class YouTubeInfo:
             'no_warnings': True,
             'extract_flat': True,
         }
+        # Свой экземпляр YoutubeDL на каждый поток: реестр экстракторов и сетевые настройки
+        # собираются один раз на поток, а запросы из разных потоков (extract_video_info_async)
+        # идут параллельно - YoutubeDL не потокобезопасен, но общий замок их бы сериализовал
+        self._local = threading.local()
+
+    def _get_ydl(self):
+        """Возвращает экземпляр YoutubeDL текущего потока, создавая его при первом обращении"""
+        ydl = getattr(self._local, 'ydl', None)
+        if ydl is None:
+            ydl = self._local.ydl = yt_dlp.YoutubeDL(self.ydl_opts)
+        return ydl
 
-    def extract_video_info(self, url):
+    def extract_video_info(self, url, lite=False):
         """
         Извлекает информацию о видео с YouTube
         
         Args:
             url (str): URL видео на YouTube
+            lite (bool): Облегченный режим для превью: описание в результате пустое. Извлечение то же,
+                что и в полном режиме, поэтому в кэш всегда попадает полная запись
             
         Returns:
             dict: Словарь с информацией о видео:
@@ -23,37 +51,44 @@ class YouTubeInfo:
                 - channel: название канала
                 - upload_date: дата загрузки
         """
+        match = _VIDEO_ID_RE.search(url)
+        cache_key = match.group('id') if match else url
+        cached = _INFO_CACHE.get(cache_key)
+        if cached is not None:
+            return dict(cached, description='') if lite else dict(cached)
+
         try:
-            with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                # Получаем информацию о видео
-                video_info = ydl.extract_info(url, download=False)
-                
-                # Формируем структурированный ответ
-                info = {
-                    'title': video_info.get('title', 'Название недоступно'),
-                    'description': video_info.get('description', 'Описание недоступно'),
-                    'duration': video_info.get('duration', 0),
-                    'channel': video_info.get('uploader', 'Канал недоступен'),
-                    'upload_date': video_info.get('upload_date', 'Дата недоступна')
-                }
-                
-                # Форматируем длительность в читаемый вид
-                if info['duration']:
-                    minutes = info['duration'] // 60
-                    seconds = info['duration'] % 60
-                    info['duration_str'] = f"{minutes}:{seconds:02d}"
-                else:
-                    info['duration_str'] = "Длительность недоступна"
-                
-                # Форматируем дату
-                if info['upload_date'] and info['upload_date'] != 'Дата недоступна':
-                    year = info['upload_date'][:4]
-                    month = info['upload_date'][4:6]
-                    day = info['upload_date'][6:8]
-                    info['upload_date'] = f"{day}.{month}.{year}"
-                
-                return info
-                
+            # Получаем информацию о видео
+            video_info = self._get_ydl().extract_info(url, download=False)
+            
+            # Формируем структурированный ответ
+            info = {
+                'title': video_info.get('title', 'Название недоступно'),
+                'description': video_info.get('description', 'Описание недоступно'),
+                'duration': video_info.get('duration', 0),
+                'channel': video_info.get('uploader', 'Канал недоступен'),
+                'upload_date': video_info.get('upload_date', 'Дата недоступна')
+            }
+            
+            # Форматируем длительность в читаемый вид
+            if info['duration']:
+                minutes = info['duration'] // 60
+                seconds = info['duration'] % 60
+                info['duration_str'] = f"{minutes}:{seconds:02d}"
+            else:
+                info['duration_str'] = "Длительность недоступна"
+            
+            # Форматируем дату
+            if info['upload_date'] and info['upload_date'] != 'Дата недоступна':
+                year = info['upload_date'][:4]
+                month = info['upload_date'][4:6]
+                day = info['upload_date'][6:8]
+                info['upload_date'] = f"{day}.{month}.{year}"
+            
+            # Ошибки не кэшируются: следующий запрос повторит извлечение
+            _INFO_CACHE.set(cache_key, info)
+            return dict(info, description='') if lite else dict(info)
+            
         except Exception as e:
             return {
                 'error': f"Ошибка при получении информации о видео: {str(e)}",
@@ -65,6 +100,13 @@ class YouTubeInfo:
                 'upload_date': 'Недоступно'
             }
 
+    async def extract_video_info_async(self, url, lite=False):
+        """
+        Асинхронный вариант extract_video_info для обработчиков бота: сетевой запрос yt-dlp
+        выполняется в потоке и не блокирует цикл событий (кэш проверяется там же)
+        """
+        return await asyncio.to_thread(self.extract_video_info, url, lite)
+
     def format_info_message(self, info):
         """
         Форматирует информацию о видео в читаемый текст с экранированием специальных символов
@@ -80,14 +122,11 @@ class YouTubeInfo:
             if not text:
                 return ""
             # Экранируем специальные символы
-            escape_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '=', '|', '{', '}', '!', '"']
-            for char in escape_chars:
-                text = text.replace(char, '\\' + char)
+            text = text.translate(_MARKDOWN_ESCAPE)
             # Удаляем множественные пробелы и невидимые символы
             text = ' '.join(text.split())
             # Ограничиваем только базовыми символами Unicode
-            text = ''.join(char for char in text if ord(char) < 65536)
-            return text
+            return _NON_BMP_RE.sub('', text)
 
         # Экранируем все поля
         safe_title = escape_markdown(info['title'])
@@ -106,7 +145,11 @@ class YouTubeInfo:
 
 📺 *Канал:* {safe_channel}
 ⏱ *Длительность:* {safe_duration}
-📅 *Дата загрузки:* {safe_date}
+📅 *Дата загрузки:* {safe_date}"""
+
+        # В облегченном режиме (lite) описания нет, раздел не выводится
+        if safe_description:
+            message += f"""
 
 📝 *Описание:*
 {safe_description}"""